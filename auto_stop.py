@@ -0,0 +1,150 @@
+# Auto stop
+# Purpose - stops resources whose reminders have had no Keep up, reserve or
+#           stop response within a grace period, in bulk, once per
+#           reminder_lambda run
+#
+# Opt-in, enabled by setting AUTO_STOP_GRACE_HOURS. Responses are read from
+# the scan history, so HISTORY_STORE must also be set. Resources whose start
+# time is unknown (ASGs, Redshift, RDS without a start index) are never
+# auto stopped. Each resource is
+# listed again (batched, per resource type) immediately before stopping so
+# that a Static or Reserved_until tag added since the reminder, or a restart,
+# is honoured
+#
+# Added to GitHub version control: 19/10/2026
+# Last updated: 19/10/2026
+
+import logging      # CloudWatch logs
+import os
+
+import resource_providers  # Listing & stopping per resource type
+import scan_history  # Reminders and responses
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Retrieve environment variables
+AUTO_STOP_GRACE_HOURS = os.environ.get('AUTO_STOP_GRACE_HOURS')
+
+# (Days) History read to find the first reminder and any response
+LOOKBACK_DAYS = 31
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Is auto stop enabled?
+def enabled():
+    return bool(AUTO_STOP_GRACE_HOURS) and bool(scan_history.HISTORY_STORE)
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Candidates from this run first reminded more than grace_hours ago, with no
+# response to any reminder since
+def unanswered(nowdatetime, candidates, grace_hours, location=scan_history.HISTORY_STORE):
+    store = scan_history.open_store(location)
+    table = scan_history.load(store, nowdatetime - timedelta(days=LOOKBACK_DAYS), nowdatetime)
+    by_resource = scan_history.episodes(table, (nowdatetime - timedelta(days=LOOKBACK_DAYS)).timestamp(), nowdatetime.timestamp())
+
+    resource_codes = table.codes['resource_id']
+    start = table.columns['start']
+    deadline = (nowdatetime - timedelta(hours=grace_hours)).timestamp()
+
+    pending = []
+    for candidate in candidates:
+        code = resource_codes.get(str(candidate['id']))
+        if code is None or code not in by_resource:
+            continue
+        # The episode of the resource's current run
+        current = [episode for episode in by_resource[code] if start[episode['row']] == candidate['start'].timestamp()]
+        if not current:
+            continue
+        episode = current[-1]
+        if episode['first_ts'] > deadline:
+            continue
+        if episode['kept_up'] or episode['reserved'] or episode['stop_ts'] is not None or episode['auto_stop_ts'] is not None:
+            continue
+        pending.append(candidate)
+    return pending
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Is a freshly listed resource still safe to stop for a candidate?
+# Conditions:
+# - resource start time is known, otherwise a restart (e.g. an ASG scaled to
+#   zero and back out) can't be told from the run that was reminded about
+# - resource is still tagged Static = no
+# - resource reserved til tag time-date has past
+# - resource has not been restarted since the reminder
+def still_stoppable(resource, candidate, nowdatetime):
+    tags = resource['tags']
+    reserved_til = resource_providers.parse_tag_time(tags.get('RESERVED_UNTIL'))
+    start = resource['start_time']
+
+    if start == None:
+        logger.info("Auto stop skipped, " + candidate['name'] + " has no known start time")
+        return False
+    if tags.get('STATIC') != 'no':
+        logger.info("Auto stop skipped, " + candidate['name'] + " is now static")
+        return False
+    if reserved_til != None and reserved_til > nowdatetime:
+        logger.info("Auto stop skipped, " + candidate['name'] + " is reserved until " + str(reserved_til))
+        return False
+    if start != candidate['start']:
+        logger.info("Auto stop skipped, " + candidate['name'] + " has been restarted")
+        return False
+    return True
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Stop pending candidates of one resource type, returns [(candidate, message, stopped)]
+def stop_resource_type(resource_type, candidates, nowdatetime):
+    provider = resource_providers.get_provider(resource_type)
+
+    # One batched listing for the type, taken at the last moment
+    # The RDS start index was brought up to date by this run's scan
+    listed = {resource['id']: resource for resource in provider.list_resources(fetch_events=False)}
+    to_stop = []
+    by_id = {}
+    for candidate in candidates:
+        resource = listed.get(candidate['id'])
+        if resource is None:
+            logger.info("Auto stop skipped, " + candidate['name'] + " is no longer running")
+        elif still_stoppable(resource, candidate, nowdatetime):
+            to_stop.append(resource)
+            by_id[resource['id']] = candidate
+
+    return [(by_id[resource['id']], message, stopped) for resource, message, stopped in provider.bulk_stop(to_stop)]
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Stop this run's candidates whose reminders went unanswered
+# Returns {owner: [(candidate, message, stopped)]}, owner None for unowned
+def run(nowdatetime, candidates):
+    if not enabled():
+        return {}
+
+    grace_hours = float(AUTO_STOP_GRACE_HOURS)
+    pending = unanswered(nowdatetime, candidates, grace_hours)
+    logger.info("Auto stop: " + str(len(pending)) + " reminders unanswered after " + str(grace_hours) + " hours")
+    if not pending:
+        return {}
+
+    by_type = {}
+    for candidate in pending:
+        by_type.setdefault(candidate['resource_type'], []).append(candidate)
+
+    def stop(item):
+        resource_type, type_candidates = item
+        try:
+            return stop_resource_type(resource_type, type_candidates, nowdatetime)
+        except Exception as err:
+            logger.error('Error auto stopping ' + resource_type + ': %s' % str(err))
+            return []
+
+    # Resource types are stopped concurrently
+    with ThreadPoolExecutor(max_workers=len(by_type)) as executor:
+        results = [result for type_results in executor.map(stop, by_type.items()) for result in type_results]
+
+    scan_history.record_auto_stops(nowdatetime, [candidate for candidate, message, stopped in results if stopped])
+
+    by_owner = {}
+    for candidate, message, stopped in results:
+        by_owner.setdefault(candidate['owner'], []).append((candidate, message, stopped))
+    return by_owner
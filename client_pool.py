@@ -0,0 +1,88 @@
+# Client pool
+# Purpose - shares boto3 clients and resources between warm invocations so
+#           that endpoint resolution and service model loading only happen
+#           once per container rather than once per click or run
+#
+# Clients are keyed by (service, region) and use the Lambda's own role
+#
+# Added to GitHub version control: 19/10/2026
+# Last updated: 19/10/2026
+
+import boto3        # AWS SDK for Python
+import logging      # CloudWatch logs
+import os
+import threading
+
+from botocore.config import Config
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Retrieve environment variables
+MAX_POOL_CONNECTIONS = int(os.environ.get('BOTO_MAX_POOL_CONNECTIONS', '50'))
+MAX_ATTEMPTS = int(os.environ.get('BOTO_MAX_ATTEMPTS', '5'))
+
+# Tuned botocore config shared by every client
+# - enough pooled connections for the concurrent scanner threads
+# - adaptive retries back off client side when AWS throttles describes
+BOTO_CONFIG = Config(
+    max_pool_connections=MAX_POOL_CONNECTIONS,
+    retries={'max_attempts': MAX_ATTEMPTS, 'mode': 'adaptive'},
+    connect_timeout=5,
+    read_timeout=30
+)
+
+# Container-level pools, kept between warm invocations
+# (kind, service, region) -> client or resource
+pool = {}
+default_session = None
+
+# boto3 sessions are not thread safe, clients are
+lock = threading.Lock()
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Session for the Lambda's own role
+# Must be called with lock held
+def get_session_locked():
+    global default_session
+    if default_session is None:
+        default_session = boto3.Session()
+    return default_session
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Session for the Lambda's own role, e.g. for clients with their own endpoint
+def get_session():
+    with lock:
+        return get_session_locked()
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Get (or create) a pooled client or resource
+def get_pooled(kind, service, region=None):
+    key = (kind, service, region)
+
+    # Fast path, no lock needed to read an existing entry
+    pooled = pool.get(key)
+    if pooled is not None:
+        return pooled
+
+    with lock:
+        pooled = pool.get(key)
+        if pooled is None:
+            session = get_session_locked()
+            if kind == 'client':
+                pooled = session.client(service, region_name=region, config=BOTO_CONFIG)
+            else:
+                pooled = session.resource(service, region_name=region, config=BOTO_CONFIG)
+            pool[key] = pooled
+        return pooled
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Pooled client, e.g. get_client('ec2', region)
+def get_client(service, region=None):
+    return get_pooled('client', service, region)
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Pooled resource, e.g. get_resource('ec2', region)
+def get_resource(service, region=None):
+    return get_pooled('resource', service, region)
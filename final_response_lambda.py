@@ -1,16 +1,20 @@
 # Lambda function
 # Purpose - Handles replies to messages from reminder_lambda
+#           (actions are dispatched through resource_providers)
 #
 #
 # Added to GitHub version control: 02/10/2018
 # Last updated: 02/10/2018
 
-import boto3        # AWS SDK for Python
 import logging      # CloudWatch logs
 import json
 import os
 import time
 
+import client_pool  # Shared boto3 clients
+import idempotency  # Duplicate action suppression
+import resource_providers  # Stop & reserve per resource type
+import scan_history  # Record of reminders and actions
 from botocore.vendored import requests
 from base64 import b64decode
 from datetime import datetime, timedelta, timezone
@@ -26,15 +30,23 @@ logger.setLevel(logging.INFO)
 # Region (https://docs.aws.amazon.com/lambda/latest/dg/current-supported-versions.html)
 region = os.environ['AWS_REGION']
 
+# Create the clients during container initialisation so clicks reuse them
+client_pool.get_client('ec2', region)
+client_pool.get_client('rds', region)
+client_pool.get_resource('ec2', region)
+
 # ----------------------------------------------------------------------------------------------------------------------
 # Post to Slack
-def post_to_slack(channel_id, message_ts, original_message, message_response, response_url):
+# /my-instances lists are kept (replace_original False) and the outcome is
+# posted below them, as replacing the list would drop every other instance
+def post_to_slack(channel_id, message_ts, original_message, message_response, response_url, replace_original=True):
 
     try:
         slack_data = {  
        "channel":channel_id,
        "ts":message_ts,
        "text":original_message,
+       "replace_original":replace_original,
        #"attachment_type": "default",
         "attachments": [
             {
@@ -62,67 +74,20 @@ def post_to_slack(channel_id, message_ts, original_message, message_response, re
         logger.error('Error: %s' % str(err))
 # ----------------------------------------------------------------------------------------------------------------------
 
-# Stop & start RDS instances
-def stop_start_rds(session, inst_name, action, instance_id_or_arn):
+# Stop instances through the provider registered for the resource type
+def stop_resource(resource_type, inst_name, instance_id_or_arn):
 
     try:
-        client = session.client('rds', region_name=region)
-        db_instances = client.describe_db_instances(DBInstanceIdentifier=inst_name)
-
-        # get the instance if it can be found
-        if len(db_instances) != 0:
-            db_instance = db_instances['DBInstances'][0]
-        else:
-            msg = ("Sorry!, I can't do that for you right now, I can't find instance *" + inst_name + "*")
-            return msg
-            raise Exception("Instance *" + inst_name + "* does not exist or is not currently launched")
-
-        curr_state = db_instance.get('DBInstanceStatus')
-
-        if (action.upper() == "STOP" and curr_state.upper() == 'AVAILABLE'):
+        provider = resource_providers.get_provider(resource_type)
+    except KeyError:
+        logger.error('Error: unknown resource type %s' % str(resource_type))
+        return ("Sorry!, I can't do that for you right now, I don't know how to stop *" + inst_name + "*")
 
-            client.stop_db_instance(DBInstanceIdentifier=inst_name)
-            msg  = ":heavy_check_mark: *" + inst_name + "* successfuly stopping"
-
-        else:
-            msg = ('*RDS* instance *' + inst_name + '* is currently *'
-                  + curr_state
-                  + '*, no action needed at this time'
-                  )
-        return msg #, response_type
-
-    except Exception as err:
-        logger.error('Error: %s' % str(err))
-        error_message = ("Sorry, the *RDS* instance *" + inst_name + "* does not exist or is not currently launched")
-        return error_message 
+    return provider.stop(inst_name, instance_id_or_arn)
 
-# ----------------------------------------------------------------------------------------------------------------------
-# # Stop & start EC2 instances
-def stop_start_ec2(session, inst_name, action, instance_id_or_arn):
-
-    try:
-
-        ec2 = session.resource('ec2', region_name=region)
-        inst = ec2.Instance(id=instance_id_or_arn)
-        # Get current state
-        curr_state = inst.state['Name']
-
-        if (action.upper() == "STOP" and curr_state.upper() == 'RUNNING'):
-
-            inst.stop()
-            msg = ":heavy_check_mark: *" + inst_name + "* successfuly stopping"
-
-        else:
-            msg = ("*EC2* instance *" + inst_name + "* is currently *" + curr_state + "*, no action needed at this time")
-        return msg 
-
-    except Exception as err:
-        logger.error('Error: %s' % str(err))
-        error_message = ("Sorry <@" + user + ">, the *EC2* instance *" + inst_name + "* cannot be found")
-        return error_message
-        
 # ----------------------------------------------------------------------------------------------------------------------
 # Instance tagging function
+# Returns (message, reserved)
 def instance_tagger(action_value, resource_type, instance_id_or_arn, instance_name, user_id):
     
     # Slack users
@@ -143,56 +108,17 @@ def instance_tagger(action_value, resource_type, instance_id_or_arn, instance_na
     logger.info("\n Tagging with Reserved_until : " + str(Reserved_until))
     
     try:
-        #Add tag EC2
-        if (resource_type).upper() == 'EC2':
-            client = boto3.client('ec2')
-            
-            # Is instance still running?
-
-            response = client.create_tags(
-                Resources=[
-                    instance_id_or_arn,
-                ],
-                Tags=[
-                    {
-                        'Key': 'Reserved_until',
-                        'Value': str(Reserved_until),
-                    },
-                    {
-                        'Key': 'Reserved_by',
-                        'Value': str(Reserved_by),
-                    },
-                ],
-            )
-
-        # Reserve RDS with tag    
-        elif (resource_type).upper() == 'RDS':    
-            client = boto3.client('rds')
-            
-            # Is instance still running?
-            response = client.describe_db_instances(
-                DBInstanceIdentifier=instance_id_or_arn,
-            )
-            
-            if response['DBInstances'][0]['DBInstanceStatus'] != 'stopped':
-
-                response = client.add_tags_to_resource(
-                        ResourceName=instance_id_or_arn,
-                        Tags=[
-                            {
-                                'Key': 'Reserved_until',
-                                'Value': str(Reserved_until)
-                            },
-                            {
-                                'Key': 'Reserved_by',
-                                'Value': str(Reserved_by),
-                            },
-                        ]
-                    )
-            else:
-                logger.error('Error: %s' % str(err))
-                message = (":x: Sorry your instance *" + instance_name + "* cannot be reserved as it is no longer running")
-                return(message)
+        # Reserve with tags, if the instance is still running
+        provider = resource_providers.get_provider(resource_type)
+        reserved = provider.reserve(instance_name, instance_id_or_arn, {
+            'Reserved_until': str(Reserved_until),
+            'Reserved_by': str(Reserved_by)
+        })
+
+        if not reserved:
+            logger.error("Instance " + instance_name + " is no longer running")
+            message = (":x: Sorry your instance *" + instance_name + "* cannot be reserved as it is no longer running")
+            return(message, False)
                 
         # Confirmation message
         if action_value == '1':
@@ -203,8 +129,9 @@ def instance_tagger(action_value, resource_type, instance_id_or_arn, instance_na
     except Exception as err:
         logger.error('Error: %s' % str(err))
         message = (":x: Sorry your instance *" + instance_name + "* cannot be reserved at this time")
+        return(message, False)
         
-    return(message)
+    return(message, True)
 
 # ----------------------------------------------------------------------------------------------------------------------
 # Main function
@@ -215,7 +142,8 @@ def lambda_handler(event, context):
     resource_type = instance_info[0]
     instance_name = instance_info[1]
     instance_id_or_arn = instance_info[2]
-    owner = instance_info[3]
+    # Unowned instances have no owner in their instance info
+    owner = instance_info[3] if len(instance_info) > 3 else None
     action_type = event['actions'][0]['type']
     # If action type is select, action value is nested under selected options
     if action_type == "button":
@@ -228,34 +156,61 @@ def lambda_handler(event, context):
     user_name = event['user']['name']
     response_url = event['response_url']
     message_ts = event['message_ts']
-    original_message = event['original_message']['text']
+    # Ephemeral messages (e.g. /my-instances) have no original message
+    original_message = event.get('original_message', {}).get('text', '')
 
     # # Log important message information
     logger.info("\nResource type: " + str(resource_type) + "\nInstance name: " + str(instance_name) + "\nInstance ID or arn (dependant on EC2 or RDS): " + str(instance_id_or_arn) + "\nResource owner: " + str(owner) + " \nAction type: " + str(action_type) + "\nAction value: " + str(action_value) + "\nChannel ID: " + str(channel_id) + "\nChannel Name: " + str(channel_name) + "\nUser ID: " + str(user_id) + "\nUser Name: " + str(user_name))
     logger.info("\noriginal_message: " + str(original_message))
 
-    #
-    # Perform actions requested by interactive buttons
-    #
-
-    session = boto3.Session()
-
-    # #
-    # # /stop
-    # #
-    if action_type == "button" and action_value == "stop":
-        action = "STOP"
-        if (resource_type).upper() == 'RDS':
-            message = stop_start_rds(session, instance_name, action, instance_id_or_arn)
-        else:
-            message = stop_start_ec2(session, instance_name, action, instance_id_or_arn)
-    
-    # #
-    # # Reserve 
-    # #
-    elif action_type == "select":
-        message = instance_tagger(action_value, resource_type, instance_id_or_arn, instance_name, user_id)
-
-    # Post updated action successful message to Slack
-    logger.info("message: " + str(message))
-    post_to_slack(channel_id, message_ts, original_message, message, response_url)
+    # Skip actions that have already been (or are being) processed, async
+    # invoke retries and repeated clicks re-run no describes, stops or tags
+    action_key = idempotency.idempotency_key('final_response', channel_id, message_ts, event['actions'][0]['name'], action_type, action_value)
+    # Key immediate_response_lambda cached its "Stopping..." update under
+    immediate_key = idempotency.idempotency_key('immediate_response', channel_id, message_ts, event['actions'][0]['name'], action_type, action_value)
+    cached_message = idempotency.claim(action_key)
+    if cached_message is not None:
+        logger.info("Duplicate action, skipping: " + action_key + "\nCached message: " + str(cached_message))
+        return cached_message
+
+    succeeded = False
+    try:
+        #
+        # Perform actions requested by interactive buttons
+        #
+
+        # #
+        # # /stop
+        # #
+        if action_type == "button" and action_value == "stop":
+            message = stop_resource(resource_type, instance_name, instance_id_or_arn)
+            # Only instances actually stopped count as a response
+            succeeded = message.startswith(resource_providers.STOPPED_MARK)
+            if succeeded:
+                scan_history.record_action('stop', resource_type, instance_id_or_arn, owner)
+        
+        # #
+        # # Reserve 
+        # #
+        elif action_type == "select":
+            message, succeeded = instance_tagger(action_value, resource_type, instance_id_or_arn, instance_name, user_id)
+            if succeeded:
+                scan_history.record_action('reserve', resource_type, instance_id_or_arn, owner, float(action_value))
+
+        # Post updated action successful message to Slack
+        logger.info("message: " + str(message))
+        post_to_slack(channel_id, message_ts, original_message, message, response_url, event.get('callback_id') != 'my_instances')
+
+    except Exception:
+        # Let a retry of this action through
+        idempotency.release(action_key)
+        idempotency.release(immediate_key)
+        raise
+
+    # Failures are not cached, so that clicking again retries the action
+    if succeeded:
+        idempotency.record(action_key, message)
+    else:
+        idempotency.release(action_key)
+        idempotency.release(immediate_key)
+    return message
@@ -0,0 +1,186 @@
+# Idempotency cache
+# Purpose - suppresses repeated interactive actions (double clicks, Slack
+#           retries, asynchronous Lambda invoke retries) so that the same
+#           action on the same message is only processed once, repeats are
+#           answered with the outcome of the first one
+#
+# Entries are held in memory for the life of the container and, when the
+# IDEMPOTENCY_TABLE environment variable is set, in a shared DynamoDB table
+# (partition key 'idempotency_key' (S), TTL attribute 'expires_at') so that
+# duplicates landing on a different container are also caught, and so that
+# final_response_lambda can release immediate_response_lambda's keys
+#
+# Added to GitHub version control: 19/10/2026
+# Last updated: 19/10/2026
+
+import logging      # CloudWatch logs
+import json
+import os
+import time
+
+import client_pool  # Shared boto3 clients
+from botocore.exceptions import ClientError
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Retrieve environment variables
+IDEMPOTENCY_TABLE = os.environ.get('IDEMPOTENCY_TABLE')
+IDEMPOTENCY_TTL = int(os.environ.get('IDEMPOTENCY_TTL', '300'))   # (Seconds)
+# (Seconds) Shorter than the 1 minute before Lambda's first asynchronous retry
+IDEMPOTENCY_PENDING_LEASE = int(os.environ.get('IDEMPOTENCY_PENDING_LEASE', '45'))
+METRIC_NAMESPACE = os.environ.get('METRIC_NAMESPACE', 'AWSAutomationReminder')
+
+# Outcome stored while the first request is still being processed
+PENDING = 'PENDING'
+
+# In memory cache, kept between warm invocations of the same container
+# key -> (expires_at, outcome)
+local_cache = {}
+
+# Duplicate hits seen by this container, by scope
+duplicate_hits = {}
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Build the idempotency key for an action on a message
+# name is the action's name (the instance info), as one message can carry
+# actions for several instances (e.g. /my-instances)
+def idempotency_key(scope, channel_id, message_ts, name, action, value):
+    return '#'.join(str(part) for part in (scope, channel_id, message_ts, name, action, value))
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Publish a duplicate hit as a CloudWatch metric using the embedded metric format
+def emit_duplicate_metric(scope):
+    duplicate_hits[scope] = duplicate_hits.get(scope, 0) + 1
+
+    # Printed rather than logged so the line is pure JSON for CloudWatch to parse
+    print(json.dumps({
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [
+                {
+                    "Namespace": METRIC_NAMESPACE,
+                    "Dimensions": [["Scope"]],
+                    "Metrics": [{"Name": "DuplicateActionHits", "Unit": "Count"}]
+                }
+            ]
+        },
+        "Scope": scope,
+        "DuplicateActionHits": 1
+    }))
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Drop expired entries from the in memory cache
+def prune_local_cache(now):
+    for key in [key for key, (expires_at, outcome) in local_cache.items() if expires_at <= now]:
+        del local_cache[key]
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Outcome of an already claimed key from the shared table
+# Returns None (process the action) if it can't be read, failing open
+def shared_outcome(key, scope):
+    try:
+        item = client_pool.get_client('dynamodb').get_item(
+            TableName=IDEMPOTENCY_TABLE,
+            Key={'idempotency_key': {'S': key}},
+            ConsistentRead=True
+        ).get('Item')
+    except Exception as err:
+        logger.error('Error in def shared_outcome(): %s' % str(err))
+        return None
+
+    # Released since the claim failed
+    if item is None:
+        return None
+    outcome = json.loads(item['outcome']['S'])
+    local_cache[key] = (int(item['expires_at']['N']), outcome)
+    logger.info("Duplicate action (shared store): " + key)
+    emit_duplicate_metric(scope)
+    return outcome
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Claim a key before processing an action
+# Returns None if this is the first time the key has been seen (the caller
+# should process the action and then call record()), otherwise returns the
+# cached outcome, or PENDING if the first request has not finished yet
+#
+# A claim only lasts IDEMPOTENCY_PENDING_LEASE, so a request that dies
+# without recording or releasing (timeout, crash) is retried
+#
+# With a shared table the table decides, as another Lambda may have released
+# the key; this container's cache is only used without one or when it fails
+def claim(key):
+    now = int(time.time())
+    scope = key.split('#', 1)[0]
+
+    prune_local_cache(now)
+    if IDEMPOTENCY_TABLE:
+        try:
+            client_pool.get_client('dynamodb').put_item(
+                TableName=IDEMPOTENCY_TABLE,
+                Item={
+                    'idempotency_key': {'S': key},
+                    'outcome': {'S': json.dumps(PENDING)},
+                    'expires_at': {'N': str(now + IDEMPOTENCY_PENDING_LEASE)}
+                },
+                # DynamoDB TTL deletion is lazy, so expired items are treated as absent
+                ConditionExpression='attribute_not_exists(idempotency_key) OR expires_at < :now',
+                ExpressionAttributeValues={':now': {'N': str(now)}}
+            )
+            local_cache[key] = (now + IDEMPOTENCY_PENDING_LEASE, PENDING)
+            return None
+
+        except ClientError as err:
+            if err.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                outcome = shared_outcome(key, scope)
+                if outcome is None:
+                    local_cache[key] = (now + IDEMPOTENCY_PENDING_LEASE, PENDING)
+                return outcome
+            # Fail open, a missed duplicate is better than a dropped action
+            logger.error('Error in def claim(): %s' % str(err))
+
+        except Exception as err:
+            logger.error('Error in def claim(): %s' % str(err))
+
+    if key in local_cache:
+        logger.info("Duplicate action (container cache): " + key)
+        emit_duplicate_metric(scope)
+        return local_cache[key][1]
+
+    local_cache[key] = (now + IDEMPOTENCY_PENDING_LEASE, PENDING)
+    return None
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Record the outcome of a processed action so that duplicates can be answered with it
+# ttl is shorter for outcomes that another Lambda may yet release
+def record(key, outcome, ttl=None):
+    expires_at = int(time.time()) + (ttl or IDEMPOTENCY_TTL)
+    local_cache[key] = (expires_at, outcome)
+
+    if IDEMPOTENCY_TABLE:
+        try:
+            client_pool.get_client('dynamodb').put_item(
+                TableName=IDEMPOTENCY_TABLE,
+                Item={
+                    'idempotency_key': {'S': key},
+                    'outcome': {'S': json.dumps(outcome)},
+                    'expires_at': {'N': str(expires_at)}
+                }
+            )
+        except Exception as err:
+            logger.error('Error in def record(): %s' % str(err))
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Release a claimed key after a failure so that a retry is processed
+def release(key):
+    local_cache.pop(key, None)
+
+    if IDEMPOTENCY_TABLE:
+        try:
+            client_pool.get_client('dynamodb').delete_item(
+                TableName=IDEMPOTENCY_TABLE,
+                Key={'idempotency_key': {'S': key}}
+            )
+        except Exception as err:
+            logger.error('Error in def release(): %s' % str(err))
@@ -2,17 +2,21 @@
 # Purpose - Verifies message, triggers Lambda to process interactive action 
 #           response, returns immediate 200 response to Slack to confirm 
 #           reciept of message and processing of action
+#           Also answers the /my-instances slash command from the inventory cache
 #
 # Added to GitHub version control: 02/10/2018
 # Last updated: 02/10/2018
 
-import boto3        # AWS SDK for Python
 import logging      # CloudWatch logs
 import json
 import os
 import hashlib
 import hmac
 
+import client_pool  # Shared boto3 clients
+import idempotency  # Duplicate action suppression
+import inventory_cache  # Owners' running resources for /my-instances
+import scan_history  # Keep up responses, for auto stop
 from base64 import b64decode
 from urllib.parse import parse_qs
 
@@ -25,11 +29,44 @@ ENCRYPTED_EXPECTED_TOKEN = os.environ['SLACK_TOKEN']
 SIGNING_SECRET = os.environ['SIGNING_SECRET']
 
 # Decrypt encrypted environment variables
-kms = boto3.client('kms')
-expected_token = boto3.client('kms').decrypt(CiphertextBlob=b64decode(ENCRYPTED_EXPECTED_TOKEN))['Plaintext'].decode('utf-8')
-signing_secret = boto3.client('kms').decrypt(CiphertextBlob=b64decode(SIGNING_SECRET))['Plaintext'].decode('utf-8')
+kms = client_pool.get_client('kms')
+expected_token = kms.decrypt(CiphertextBlob=b64decode(ENCRYPTED_EXPECTED_TOKEN))['Plaintext'].decode('utf-8')
+signing_secret = kms.decrypt(CiphertextBlob=b64decode(SIGNING_SECRET))['Plaintext'].decode('utf-8')
 
-client = boto3.client('lambda')
+client = client_pool.get_client('lambda')
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Invoke final_response_lambda once per action
+# Duplicate clicks and Slack retries of the same action on the same message are
+# answered with the cached message update and do not invoke the Lambda again
+def invoke_final_response(body, action_key, message_update):
+
+    cached_update = idempotency.claim(action_key)
+    if cached_update is not None:
+        logger.info("Duplicate action, final_response_lambda not invoked: " + action_key)
+        if cached_update == idempotency.PENDING:
+            return message_update
+        return cached_update
+
+    try:
+        # Invoke final response Lambda using invocation type: 'Event'
+        response = client.invoke(
+            FunctionName='final_response_lambda',
+            InvocationType='Event',
+            LogType='None',
+            Payload= json.dumps(body),
+        )
+        logger.info("Lambda invoke: " + str(response))
+
+    except Exception:
+        # Let a retry of this action through
+        idempotency.release(action_key)
+        raise
+
+    # Only held for the lease, final_response_lambda decides the outcome and
+    # can't reach this container's cache when it fails
+    idempotency.record(action_key, message_update, idempotency.IDEMPOTENCY_PENDING_LEASE)
+    return message_update
 
 # ----------------------------------------------------------------------------------------------------------------------
 # Verify the Slack Signature and Verification token
@@ -60,6 +97,93 @@ def verify(raw_body, token, headers):
         logger.error('Error: %s' % str(err))
         return False
 
+# ----------------------------------------------------------------------------------------------------------------------
+# /my-instances slash command
+# Lists the caller's running instances with the same Stop / Keep up actions as
+# a reminder, served from the inventory cache to answer within 3 seconds
+# statuses ({instance_info: attachment}) replace the attachments of instances
+# that have been acted on, so an action updates one instance and keeps the list
+def my_instances(user_id, statuses=None):
+    statuses = statuses or {}
+
+    # Slack users
+        # cyoung = @cyoung
+        # user_2 = @user_2
+        
+    owner_dict = {
+                    "cyoung" : "xxxxxxxxx",
+                    "user_2" : "zzzzzzzzz"
+                }
+
+    owners = [owner for owner, slack_owner in owner_dict.items() if slack_owner == user_id]
+    if not owners:
+        return {
+            "response_type": 'ephemeral',
+            "text": 'Sorry, I don\'t know which instances are yours, contact DevOps'
+        }
+    owner = owners[0]
+
+    resources = inventory_cache.get_owner_resources(owner)
+    if not resources and not statuses:
+        return {
+            "response_type": 'ephemeral',
+            "text": ":sleeping: You have no running instances"
+        }
+
+    attachments = []
+    # Slack allows at most 20 attachments per message
+    for resource in resources[:20]:
+        instance_info = (resource['resource_type'] + ' ' + resource['name'] + ' ' + resource['id'] + ' ' + owner)
+        if instance_info in statuses:
+            attachments.append(dict(statuses.pop(instance_info), callback_id="my_instances"))
+            continue
+        uphours = inventory_cache.uptime_hours(resource)
+        text = "*" + resource['resource_type'] + "* *" + resource['name'] + "*"
+        if uphours != None:
+            text = text + " has been running for *" + str(uphours) + "* hours"
+        if resource['reserved_until'] != None:
+            text = text + ", reserved until " + resource['reserved_until'][:16]
+        attachments.append({
+            "fallback": "Sorry, an error has occured",
+            "callback_id": "my_instances",
+            "attachment_type": "default",
+            "text": text,
+            "actions": [
+                {
+                    "name": instance_info,
+                    "text": "Stop",
+                    "style": "danger",
+                    "type": "button",
+                    "value": "stop",
+                    "confirm": {
+                        "title": "Are you sure?",
+                        "text": ":electric_plug:  This will stop your instance",
+                        "ok_text": "Shutdown",
+                        "dismiss_text": "Cancel"
+                    }
+                },
+                {
+                    "name": instance_info,
+                    "text": "Keep up",
+                    "type": "button",
+                    "value": "keep_up"
+                }
+            ]
+        })
+
+    # Acted on instances no longer in the inventory are still shown, first
+    attachments = [dict(attachment, callback_id="my_instances") for attachment in statuses.values()] + attachments
+
+    text = "Hey " + owner + ", you have *" + str(len(resources)) + "* running instances"
+    if len(resources) > len(attachments):
+        text = text + " (showing the first " + str(len(attachments)) + ")"
+    return {
+        "response_type": 'ephemeral',
+        "replace_original": True,
+        "text": text,
+        "attachments": attachments
+    }
+
 # ----------------------------------------------------------------------------------------------------------------------
 # Main function
 def lambda_handler(event, context):
@@ -68,10 +192,29 @@ def lambda_handler(event, context):
     try:
         # body
         raw_body = event["body"]
-        body = json.loads(parse_qs(raw_body)['payload'][0])
+        params = parse_qs(raw_body)
         
         # headers
         headers = event["headers"]
+
+        # Slash commands are sent as form fields rather than a JSON payload
+        if 'command' in params:
+            if not verify(raw_body, params['token'][0], headers):
+                logger.error("Message not verified")
+                return {
+                    "response_type": 'ephemeral',
+                    "text": 'Message could not be verified, contact DevOps'
+                }
+            command = params['command'][0]
+            logger.info("\nCommand: " + str(command) + "\nUser ID: " + str(params['user_id'][0]))
+            if command == '/my-instances':
+                return my_instances(params['user_id'][0])
+            return {
+                "response_type": 'ephemeral',
+                "text": 'Sorry, I don\'t know the command ' + str(command)
+            }
+
+        body = json.loads(params['payload'][0])
         
         # Verify message
         if not verify(raw_body, body["token"], headers):
@@ -88,7 +231,8 @@ def lambda_handler(event, context):
         resource_type = instance_info_list[0]
         instance_name = instance_info_list[1]
         instance_id_or_arn = instance_info_list[2]
-        owner = instance_info_list[3]
+        # Unowned instances have no owner in their instance info
+        owner = instance_info_list[3] if len(instance_info_list) > 3 else None
         action_type = body['actions'][0]['type']
         # If action type is select, action value is nested under selected options
         if action_type == "button":
@@ -101,7 +245,9 @@ def lambda_handler(event, context):
         user_name = body['user']['name']
         #response_url = body['response_url']
         message_ts = body['message_ts']
-        original_message = body['original_message']['text']
+        # Ephemeral messages (e.g. /my-instances) have no original message
+        original_message = body.get('original_message', {}).get('text', '')
+        action_key = idempotency.idempotency_key('immediate_response', channel_id, message_ts, instance_info, action_type, action_value)
         
         # # Log important message information
         logger.info("\nResource type: " + str(resource_type) + "\nInstance name: " + str(instance_name) + "\nInstance ID or arn (dependant on EC2 or RDS): " + str(instance_id_or_arn) + "\nResource owner: " + str(owner) + " \nAction type: " + str(action_type) + "\nAction value: " + str(action_value) + "\nChannel ID: " + str(channel_id) + "\nChannel Name: " + str(channel_name) + "\nUser ID: " + str(user_id) + "\nUser Name: " + str(user_name))
@@ -112,6 +258,9 @@ def lambda_handler(event, context):
         # as no further actions are required if you are keeping the instance up
         if action_type == "button" and action_value == "keep_up":
             
+            # A kept up instance is never auto stopped for this reminder
+            scan_history.record_action('keep_up', resource_type, instance_id_or_arn, owner)
+            
             message_update = {
         "channel":channel_id,
         "ts":message_ts,
@@ -161,14 +310,6 @@ def lambda_handler(event, context):
             
         elif action_type == "button" and action_value == "stop":
             message_response  = ":bomb: Stopping *" + str(instance_name) + "*..."
-            # Invoke Lambda using invocation type: 'Event'
-            response = client.invoke(
-                FunctionName='final_response_lambda',
-                InvocationType='Event',
-                LogType='None',
-                Payload= json.dumps(body),
-            )
-            logger.info("Lambda invoke: " + str(response))
             
             message_update = {  
               "channel":channel_id,
@@ -183,21 +324,13 @@ def lambda_handler(event, context):
                     }
                 ]
             }
+            message_update = invoke_final_response(body, action_key, message_update)
             
         elif action_type == "select":
             if action_value == '1':
                 message_response  = ":money_with_wings: Reserving *" + str(instance_name) + "* for *" + action_value + "* day..."
             else:
                 message_response  = ":money_with_wings: Reserving *" + str(instance_name) + "* for *" + action_value + "* days..."
-            # Invoke final response Lambda using invocation type: 'Event'
-            response = client.invoke(
-                FunctionName='final_response_lambda',
-                InvocationType='Event',
-                LogType='None',
-                Payload= json.dumps(body),
-            )
-            logger.info("Lambda invoke: " + str(response))
-    
         
             message_update = {  
               "channel":channel_id,
@@ -212,6 +345,11 @@ def lambda_handler(event, context):
                     }
                 ]
             }
+            message_update = invoke_final_response(body, action_key, message_update)
+
+        # /my-instances lists are rebuilt with only this instance updated
+        if body.get('callback_id') == 'my_instances':
+            message_update = my_instances(user_id, {instance_info: message_update['attachments'][0]})
 
         # Return Message update to the API Gateway
         logger.info("\nMessage Update: " + str(message_update))
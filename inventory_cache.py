@@ -0,0 +1,156 @@
+# Inventory cache
+# Purpose - keeps every owner's running resources tagged Static = no, as
+#           found by the last complete reminder_lambda scan, so that the /my-instances slash command can
+#           answer within Slack's 3 second limit without describing anything
+#
+# The inventory is held in a DynamoDB table (INVENTORY_TABLE, partition key
+# 'owner' (S)) with one item per owner and a '#meta' item recording when the
+# last scan finished. An owner item older than the last scan means the owner
+# had no running resources in it. A scan in which any resource type failed
+# is not written. When the last scan is older than INVENTORY_MAX_AGE, EC2
+# and RDS are described live instead
+#
+# Added to GitHub version control: 19/10/2026
+# Last updated: 19/10/2026
+
+import logging      # CloudWatch logs
+import json
+import os
+import time
+
+import client_pool  # Shared boto3 clients
+import resource_providers  # Live fallback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Retrieve environment variables
+INVENTORY_TABLE = os.environ.get('INVENTORY_TABLE')
+INVENTORY_MAX_AGE = int(os.environ.get('INVENTORY_MAX_AGE', '7200'))       # (Seconds) Before the cache is stale
+INVENTORY_LOCAL_TTL = int(os.environ.get('INVENTORY_LOCAL_TTL', '60'))     # (Seconds) Kept in the container
+
+META_OWNER = '#meta'
+
+# Resource types described live when the cache is stale
+FALLBACK_TYPES = ['EC2', 'RDS']
+
+# In memory cache, kept between warm invocations of the same container
+# owner -> (fetched_at, resources)
+local_cache = {}
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Inventory entry for a resource listed by a provider
+# start is None when the start time is unknown, the launch (creation) time
+# would show as a made up uptime
+def inventory_entry(resource):
+    start = resource['start_time']
+    return {
+        'resource_type': resource['resource_type'],
+        'name': resource['name'],
+        'id': resource['id'],
+        'owner': resource['tags'].get('OWNER'),
+        'static': resource['tags'].get('STATIC'),
+        'reserved_until': resource['tags'].get('RESERVED_UNTIL'),
+        'start': str(start) if start != None else None
+    }
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Group inventory entries by owner, unowned resources are not listed
+def entries_by_owner(resources):
+    owners = {}
+    for resource in resources:
+        entry = inventory_entry(resource)
+        if entry['owner'] != None:
+            owners.setdefault(entry['owner'], []).append(entry)
+    return owners
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Replace the inventory with the resources found by a scan
+def refresh(nowdatetime, resources):
+    if not INVENTORY_TABLE:
+        return
+    try:
+        refreshed_at = int(nowdatetime.timestamp())
+        owners = entries_by_owner(resources)
+
+        table = client_pool.get_resource('dynamodb').Table(INVENTORY_TABLE)
+        with table.batch_writer() as batch:
+            for owner, entries in owners.items():
+                batch.put_item(Item={'owner': owner, 'resources': json.dumps(entries), 'refreshed_at': refreshed_at})
+        # Written last, so owners are never read as empty part way through a refresh
+        table.put_item(Item={'owner': META_OWNER, 'refreshed_at': refreshed_at})
+
+        logger.info("Inventory refreshed: " + str(len(owners)) + " owners, " + str(len(resources)) + " resources")
+
+    except Exception as err:
+        logger.error('Error in def refresh(): %s' % str(err))
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Describe an owner's EC2 and RDS resources live
+# Both are described concurrently to stay inside Slack's time limit
+def live_lookup(owner):
+
+    def describe(resource_type):
+        # No event history lookups on the slash command's 3 second path
+        resources = resource_providers.get_provider(resource_type).list_resources(fetch_events=False)
+        for resource in resources:
+            resource['resource_type'] = resource_type
+        return resources
+
+    with ThreadPoolExecutor(max_workers=len(FALLBACK_TYPES)) as executor:
+        resources = [resource for resources in executor.map(describe, FALLBACK_TYPES) for resource in resources]
+    return entries_by_owner(resources).get(owner, [])
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Running resources for an owner, from the cache if it is fresh
+def get_owner_resources(owner):
+    now = time.time()
+
+    cached = local_cache.get(owner)
+    if cached is not None and now - cached[0] < INVENTORY_LOCAL_TTL:
+        return cached[1]
+
+    resources = None
+    if INVENTORY_TABLE:
+        try:
+            response = client_pool.get_client('dynamodb').batch_get_item(
+                RequestItems={
+                    INVENTORY_TABLE: {
+                        'Keys': [{'owner': {'S': owner}}, {'owner': {'S': META_OWNER}}],
+                        'ConsistentRead': False
+                    }
+                }
+            )
+            items = {item['owner']['S']: item for item in response['Responses'].get(INVENTORY_TABLE, [])}
+            meta = items.get(META_OWNER)
+
+            if meta is not None and now - int(meta['refreshed_at']['N']) < INVENTORY_MAX_AGE:
+                item = items.get(owner)
+                # Owner items are written before the '#meta' item, so a newer one is mid refresh
+                if item is not None and int(item['refreshed_at']['N']) >= int(meta['refreshed_at']['N']):
+                    resources = json.loads(item['resources']['S'])
+                else:
+                    # Not in the last scan, so nothing running
+                    resources = []
+            else:
+                logger.info("Inventory cache is stale, describing live")
+
+        except Exception as err:
+            logger.error('Error in def get_owner_resources(): %s' % str(err))
+
+    if resources is None:
+        resources = live_lookup(owner)
+
+    local_cache[owner] = (now, resources)
+    return resources
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Hours a resource has been running, from its inventory entry
+def uptime_hours(entry, nowdatetime=None):
+    if entry['start'] == None:
+        return None
+    nowdatetime = nowdatetime or datetime.now(timezone.utc)
+    return int(((nowdatetime - resource_providers.parse_tag_time(entry['start'])).total_seconds())/3600)
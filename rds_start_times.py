@@ -0,0 +1,189 @@
+# RDS start times
+# Purpose - works out when each RDS instance (and Aurora cluster) was last
+#           started from the RDS event history, replacing the Started tag
+#           written by the separate RDS status change Lambda
+#
+# One paginated describe_events call per source type per run builds an index
+# of the latest start (or restart, or creation) event per identifier. The
+# index is kept in memory and in the START_INDEX_STORE (defaults to the
+# HISTORY_STORE), so each run only fetches events since the previous one.
+#
+# RDS only keeps 14 days of events. A running instance with no start event
+# since the index began has been running since at least then, so that time
+# is used as its start time. This needs a store, so that the index (and the
+# time it began) outlives the container; without one such instances fall
+# back to their creation time
+#
+# Added to GitHub version control: 19/10/2026
+# Last updated: 19/10/2026
+
+import logging      # CloudWatch logs
+import json
+import os
+import threading
+
+import client_pool  # Shared boto3 clients
+import scan_history  # Store locations
+from datetime import datetime, timedelta, timezone
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Region (https://docs.aws.amazon.com/lambda/latest/dg/current-supported-versions.html)
+region = os.environ.get('AWS_REGION')
+
+# Retrieve environment variables
+START_INDEX_STORE = os.environ.get('START_INDEX_STORE', scan_history.HISTORY_STORE)
+
+# RDS keeps events for 14 days
+LOOKBACK = timedelta(days=14)
+# Events can be published a little after they happen
+OVERLAP = timedelta(minutes=5)
+
+# Event messages that mean the source is running from the event's time
+START_MESSAGES = (
+    'db instance started',
+    'db instance restarted',
+    'db instance created',
+    'db instance is being started',     # Automatic start after 7 days stopped
+    'db cluster started',
+    'db cluster created',
+    'db cluster is being started'
+)
+
+# In memory indexes, kept between warm invocations of the same container
+# source type -> {'covered_from': datetime, 'fetched_until': datetime, 'starts': {identifier: datetime}}
+indexes = {}
+
+# One lock per source type, so instances and clusters are fetched concurrently
+locks = {}
+locks_lock = threading.Lock()
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Lock for a source type
+def get_lock(source_type):
+    with locks_lock:
+        return locks.setdefault(source_type, threading.Lock())
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Does an event mean its source was (re)started?
+def is_start_event(event):
+    message = event.get('Message', '').lower()
+    return any(message.startswith(start) for start in START_MESSAGES)
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Load a saved index from the store
+def load_index(source_type):
+    if not START_INDEX_STORE:
+        return None
+    try:
+        data = scan_history.open_store(START_INDEX_STORE).read('rds_start_times-' + source_type + '.json')
+        if data is None:
+            return None
+        saved = json.loads(data.decode('utf-8'))
+        return {
+            'covered_from': datetime.fromisoformat(saved['covered_from']),
+            'fetched_until': datetime.fromisoformat(saved['fetched_until']),
+            'starts': {identifier: datetime.fromisoformat(start) for identifier, start in saved['starts'].items()}
+        }
+    except Exception as err:
+        logger.error('Error in def load_index(): %s' % str(err))
+        return None
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Save an index to the store
+def save_index(source_type, index):
+    if not START_INDEX_STORE:
+        return
+    try:
+        saved = {
+            'covered_from': index['covered_from'].isoformat(),
+            'fetched_until': index['fetched_until'].isoformat(),
+            'starts': {identifier: start.isoformat() for identifier, start in index['starts'].items()}
+        }
+        scan_history.open_store(START_INDEX_STORE).write('rds_start_times-' + source_type + '.json', json.dumps(saved).encode('utf-8'))
+    except Exception as err:
+        logger.error('Error in def save_index(): %s' % str(err))
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Latest start times for a source type ('db-instance' or 'db-cluster')
+# Returns ({identifier: start datetime}, covered_from), covered_from being
+# the start time to use for running sources with no start event. covered_from
+# is None when there is no START_INDEX_STORE, as an index rebuilt by every
+# cold container would give a made up start that moves from run to run.
+# Returns ({}, None) if the event history cannot be read
+#
+# With fetch_events=False the in memory or saved index is used as it is, with
+# no describe_events calls and nothing saved
+def resolve(source_type, nowdatetime, fetch_events=True):
+    with get_lock(source_type):
+        index = indexes.get(source_type) or load_index(source_type)
+
+        if not fetch_events:
+            if index is None:
+                return {}, None
+            indexes[source_type] = index
+            return dict(index['starts']), index['covered_from'] if START_INDEX_STORE else None
+
+        # Too old to bring up to date from the event history, start again
+        if index is None or index['fetched_until'] < nowdatetime - LOOKBACK + OVERLAP:
+            index = {'covered_from': nowdatetime - LOOKBACK, 'fetched_until': nowdatetime - LOOKBACK, 'starts': {}}
+
+        try:
+            new_events = 0
+            paginator = client_pool.get_client('rds', region).get_paginator('describe_events')
+            pages = paginator.paginate(
+                SourceType=source_type,
+                StartTime=max(index['fetched_until'] - OVERLAP, nowdatetime - LOOKBACK),
+                EndTime=nowdatetime
+            )
+            for page in pages:
+                for event in page['Events']:
+                    if not is_start_event(event):
+                        continue
+                    identifier = event['SourceIdentifier']
+                    if identifier not in index['starts'] or event['Date'] > index['starts'][identifier]:
+                        index['starts'][identifier] = event['Date']
+                        new_events += 1
+            index['fetched_until'] = nowdatetime
+
+        except Exception as err:
+            logger.error('Error in def resolve(): %s' % str(err))
+            return {}, None
+
+        logger.info("RDS " + source_type + " start index: " + str(new_events) + " new start events, " + str(len(index['starts'])) + " sources, covered from " + str(index['covered_from']))
+        indexes[source_type] = index
+        save_index(source_type, index)
+        return dict(index['starts']), index['covered_from'] if START_INDEX_STORE else None
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Drop sources that no longer exist from an index, so it doesn't grow forever
+# existing is every identifier of the source type, running or not, from a
+# complete describe
+def forget_deleted(source_type, existing):
+    with get_lock(source_type):
+        index = indexes.get(source_type)
+        if index is None:
+            return
+        deleted = [identifier for identifier in index['starts'] if identifier not in existing]
+        if not deleted:
+            return
+        for identifier in deleted:
+            del index['starts'][identifier]
+        logger.info("RDS " + source_type + " start index: forgot " + str(len(deleted)) + " deleted sources")
+        save_index(source_type, index)
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Start time of one source from a resolved index
+# Sources with no start event have been running since at least covered_from,
+# or since they were created if that is later. None (creation time is used)
+# when there is no covered_from
+def start_time(starts, covered_from, identifier, create_time):
+    if identifier in starts:
+        return starts[identifier]
+    if covered_from == None:
+        return None
+    if create_time != None and create_time > covered_from:
+        return create_time
+    return covered_from
@@ -0,0 +1,608 @@
+# Resource providers
+# Purpose - one provider per reminder resource type, each knowing how to
+#           list its running resources together with their tags in batched
+#           calls, and how to stop and reserve a single resource
+#
+# reminder_lambda scans every registered provider concurrently and the
+# response Lambdas dispatch stop and reserve actions through the registry
+# using the resource type sent in the Slack message
+#
+# A resource is only ever a reminder candidate when it is tagged Static = no
+#
+# Added to GitHub version control: 19/10/2026
+# Last updated: 19/10/2026
+
+import logging      # CloudWatch logs
+import os
+
+import client_pool  # Shared boto3 clients
+import rds_start_times  # RDS & Aurora start times from the event history
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Region (https://docs.aws.amazon.com/lambda/latest/dg/current-supported-versions.html)
+region = os.environ.get('AWS_REGION')
+
+# Resource types scanned by reminder_lambda, comma separated
+RESOURCE_TYPES = os.environ.get('RESOURCE_TYPES', 'EC2,RDS,AURORA,ASG,SAGEMAKER,REDSHIFT')
+
+# Registered providers, resource type -> provider
+PROVIDERS = {}
+
+# Stop messages start with this when the stop was successful
+STOPPED_MARK = ':heavy_check_mark:'
+
+# Most stop calls made at once by bulk_stop()
+BULK_STOP_WORKERS = 10
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Parse a date-time tag value written by str(datetime), e.g. 2018-08-17 15:26:34.462614+00:00
+def parse_tag_time(value):
+    if value is None:
+        return None
+    try:
+        tag_time = datetime.fromisoformat(value)
+    except ValueError:
+        logger.error("Unable to parse date-time tag value: " + str(value))
+        return None
+    if tag_time.tzinfo is None:
+        tag_time = tag_time.replace(tzinfo=timezone.utc)
+    return tag_time
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Tags as {KEY: value} with upper case keys, from [{'Key': k, 'Value': v}]
+def tag_dict(tag_list):
+    return {tag['Key'].upper(): tag['Value'] for tag in (tag_list or [])}
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Provider interface
+class ResourceProvider:
+
+    resource_type = None        # Sent in Slack messages, e.g. 'EC2'
+    noun = 'instance'           # Used in reminder messages
+    uptime_verb = 'running'     # "It has been <uptime_verb> for..."
+    running_limit = 4           # (Hours) Don't remind if started in the last this many hours
+    launched_limit = 120        # (Hours) As above, from creation when the start time is unknown
+
+    # List running resources tagged Static = no as dicts with keys:
+    #   name, id (ID or ARN sent through Slack), tags ({KEY: value}),
+    #   start_time (None when unknown), launch_time and resource_class
+    #   (instance type or size, '' when there is none)
+    #   Providers may add their own keys, e.g. state for RDS
+    # fetch_events=False is for latency sensitive callers (the /my-instances
+    # live fallback), start times then only come from already saved indexes
+    def list_resources(self, fetch_events=True):
+        raise NotImplementedError
+
+    # Stop (or scale down) a resource, returns the message for Slack
+    def stop(self, name, resource_id):
+        raise NotImplementedError
+
+    # Write tags ({Key: value}) to a resource
+    def add_tags(self, name, resource_id, tags):
+        raise NotImplementedError
+
+    # Is the resource still running? Checked before reserving
+    def is_running(self, name, resource_id):
+        return True
+
+    # Reserve a resource with tags, returns False if it is no longer running
+    def reserve(self, name, resource_id, tags):
+        if not self.is_running(name, resource_id):
+            return False
+        self.add_tags(name, resource_id, tags)
+        return True
+
+    # Stop many resources (as listed by list_resources()) at once
+    # Returns [(resource, message, stopped)], stops are made concurrently
+    # unless the provider overrides this with a batched stop call
+    def bulk_stop(self, resources):
+        if not resources:
+            return []
+        with ThreadPoolExecutor(max_workers=min(len(resources), BULK_STOP_WORKERS)) as executor:
+            messages = list(executor.map(lambda resource: self.stop(resource['name'], resource['id']), resources))
+        return [(resource, message, message.startswith(STOPPED_MARK)) for resource, message in zip(resources, messages)]
+
+    # Message for a resource that is not in a state that can be stopped
+    def no_action_message(self, name, curr_state):
+        return ("*" + self.resource_type + "* " + self.noun + " *" + name + "* is currently *" + curr_state + "*, no action needed at this time")
+
+    # Determines which running resources are candidates for stopping
+    # Conditions:
+    # - resource is tagged Static = no
+    # - resource reserved til tag time-date has past
+    # - start time was more than running_limit hours ago, or when the start
+    #   time is unknown, launch time was more than launched_limit hours ago
+    def find_candidates(self, nowdatetime, resources=None):
+        if resources is None:
+            resources = self.list_resources()
+        candidates = []
+        for resource in resources:
+            tags = resource['tags']
+            reserved_til = parse_tag_time(tags.get('RESERVED_UNTIL'))
+            start_time = resource['start_time']
+            launch_time = resource['launch_time']
+
+            # Logging conditions
+            logger.info("\nResource type: " + self.resource_type + "\nInstance: " + resource['name'] + "\nInstanceStatic?: " + str(tags.get('STATIC')) + "\nStart time: " + str(start_time) + "\nLaunch: " + str(launch_time) + "\nReserved til: " + str(reserved_til) + "\nNow: " + str(nowdatetime))
+
+            if tags.get('STATIC') != 'no' or (reserved_til != None and reserved_til > nowdatetime):
+                continue
+
+            if start_time != None:
+                if start_time > nowdatetime - timedelta(hours=self.running_limit):
+                    continue
+                uphours = int(((nowdatetime - start_time).total_seconds())/3600)
+                if uphours <= 1:
+                    h_word = "hour"
+                else:
+                    h_word = "hours"
+                uptime = "It has been " + self.uptime_verb + " for *" + str(uphours) + "* " + h_word
+            else:
+                if launch_time == None or launch_time > nowdatetime - timedelta(hours=self.launched_limit):
+                    continue
+                updays = int(((nowdatetime - launch_time).total_seconds())/(3600*24))
+                uptime = "It has been launched for *" + str(updays) + "* days"
+
+            candidates.append({
+                'resource_type': self.resource_type,
+                'noun': self.noun,
+                'name': resource['name'],
+                'id': resource['id'],
+                'owner': tags.get('OWNER'),
+                'resource_class': resource['resource_class'],
+                'start': start_time if start_time != None else launch_time,
+                'uptime': uptime
+            })
+        return candidates
+
+# ----------------------------------------------------------------------------------------------------------------------
+# EC2 instances
+class EC2Provider(ResourceProvider):
+
+    resource_type = 'EC2'
+    uptime_verb = 'up'
+    running_limit = 4
+
+    def list_resources(self, fetch_events=True):
+        resources = []
+        paginator = client_pool.get_client('ec2', region).get_paginator('describe_instances')
+        pages = paginator.paginate(
+            Filters=[
+                {'Name': 'instance-state-name', 'Values': ['running']},
+                {'Name': 'tag:Static', 'Values': ['no']}
+            ]
+        )
+        for page in pages:
+            for reservation in page['Reservations']:
+                for instance in reservation['Instances']:
+                    tags = tag_dict(instance.get('Tags'))
+                    resources.append({
+                        'name': tags.get('NAME', instance['InstanceId']),
+                        'id': instance['InstanceId'],
+                        'tags': tags,
+                        'start_time': instance['LaunchTime'],
+                        'launch_time': instance['LaunchTime'],
+                        'resource_class': instance['InstanceType']
+                    })
+        return resources
+
+    def stop(self, name, resource_id):
+        try:
+            inst = client_pool.get_resource('ec2', region).Instance(id=resource_id)
+            # Get current state
+            curr_state = inst.state['Name']
+
+            if curr_state.upper() == 'RUNNING':
+                inst.stop()
+                return ":heavy_check_mark: *" + name + "* successfuly stopping"
+            return self.no_action_message(name, curr_state)
+
+        except Exception as err:
+            logger.error('Error: %s' % str(err))
+            return ("Sorry, the *EC2* instance *" + name + "* cannot be found")
+
+    # One stop_instances call per 100 instances
+    # One instance can fail a whole call (e.g. a spot instance returns
+    # UnsupportedOperation), so a failed call is retried instance by instance
+    def bulk_stop(self, resources):
+        client = client_pool.get_client('ec2', region)
+        results = []
+        for index in range(0, len(resources), 100):
+            chunk = resources[index:index + 100]
+            stopping = set()
+            try:
+                response = client.stop_instances(InstanceIds=[resource['id'] for resource in chunk])
+                stopping = {instance['InstanceId'] for instance in response['StoppingInstances']}
+            except Exception as err:
+                logger.error('Error stopping instances in bulk, retrying one at a time: %s' % str(err))
+                for resource in chunk:
+                    try:
+                        response = client.stop_instances(InstanceIds=[resource['id']])
+                        stopping.update(instance['InstanceId'] for instance in response['StoppingInstances'])
+                    except Exception as err:
+                        logger.error('Error stopping ' + resource['id'] + ': %s' % str(err))
+            for resource in chunk:
+                if resource['id'] in stopping:
+                    results.append((resource, STOPPED_MARK + " *" + resource['name'] + "* successfuly stopping", True))
+                else:
+                    results.append((resource, "Sorry, the *EC2* instance *" + resource['name'] + "* could not be stopped", False))
+        return results
+
+    def add_tags(self, name, resource_id, tags):
+        client_pool.get_client('ec2', region).create_tags(
+            Resources=[resource_id],
+            Tags=[{'Key': key, 'Value': value} for key, value in tags.items()]
+        )
+
+# ----------------------------------------------------------------------------------------------------------------------
+# RDS instances (Aurora cluster members are handled by AuroraProvider)
+class RDSProvider(ResourceProvider):
+
+    resource_type = 'RDS'
+    running_limit = 6       # (Hours) using the start time from the event history
+    launched_limit = 120    # (Hours) using the launch time, if the event history can't be read
+
+    def list_resources(self, fetch_events=True):
+        resources = []
+        # Start times from one batched event history lookup
+        starts, covered_from = rds_start_times.resolve('db-instance', datetime.now(timezone.utc), fetch_events)
+        existing = set()
+        paginator = client_pool.get_client('rds', region).get_paginator('describe_db_instances')
+        for page in paginator.paginate():
+            for inst in page['DBInstances']:
+                existing.add(inst['DBInstanceIdentifier'])
+                if inst.get('DBClusterIdentifier') or inst.get('DBInstanceStatus') in ('stopped', 'stopping'):
+                    continue
+                # Tags are returned by describe, no list_tags_for_resource per instance
+                tags = tag_dict(inst.get('TagList'))
+                # describe_db_instances can't filter on tags
+                if tags.get('STATIC') != 'no':
+                    continue
+                resources.append({
+                    'name': inst['DBInstanceIdentifier'],
+                    'id': inst['DBInstanceArn'],
+                    'tags': tags,
+                    'start_time': rds_start_times.start_time(starts, covered_from, inst['DBInstanceIdentifier'], inst.get('InstanceCreateTime')),
+                    'launch_time': inst.get('InstanceCreateTime'),
+                    'resource_class': inst['DBInstanceClass'],
+                    'state': inst.get('DBInstanceStatus')
+                })
+        if fetch_events:
+            rds_start_times.forget_deleted('db-instance', existing)
+        return resources
+
+    def stop(self, name, resource_id):
+        try:
+            db_instance = client_pool.get_client('rds', region).describe_db_instances(DBInstanceIdentifier=name)['DBInstances'][0]
+            curr_state = db_instance.get('DBInstanceStatus')
+
+            if curr_state.upper() == 'AVAILABLE':
+                client_pool.get_client('rds', region).stop_db_instance(DBInstanceIdentifier=name)
+                return ":heavy_check_mark: *" + name + "* successfuly stopping"
+            return self.no_action_message(name, curr_state)
+
+        except Exception as err:
+            logger.error('Error: %s' % str(err))
+            return ("Sorry, the *RDS* instance *" + name + "* does not exist or is not currently launched")
+
+    # Concurrent stop_db_instance calls, the listing has already described them
+    def bulk_stop(self, resources):
+
+        def stop_db_instance(resource):
+            # Only available instances can be stopped, others (starting,
+            # modifying...) would just return an error
+            if resource['state'] != 'available':
+                return (resource, self.no_action_message(resource['name'], str(resource['state'])), False)
+            try:
+                client_pool.get_client('rds', region).stop_db_instance(DBInstanceIdentifier=resource['name'])
+                return (resource, STOPPED_MARK + " *" + resource['name'] + "* successfuly stopping", True)
+            except Exception as err:
+                logger.error('Error: %s' % str(err))
+                return (resource, "Sorry, the *RDS* instance *" + resource['name'] + "* could not be stopped", False)
+
+        if not resources:
+            return []
+        with ThreadPoolExecutor(max_workers=min(len(resources), BULK_STOP_WORKERS)) as executor:
+            return list(executor.map(stop_db_instance, resources))
+
+    def is_running(self, name, resource_id):
+        response = client_pool.get_client('rds', region).describe_db_instances(DBInstanceIdentifier=resource_id)
+        return response['DBInstances'][0]['DBInstanceStatus'] != 'stopped'
+
+    def add_tags(self, name, resource_id, tags):
+        client_pool.get_client('rds', region).add_tags_to_resource(
+            ResourceName=resource_id,
+            Tags=[{'Key': key, 'Value': value} for key, value in tags.items()]
+        )
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Aurora clusters
+class AuroraProvider(ResourceProvider):
+
+    resource_type = 'AURORA'
+    noun = 'cluster'
+    running_limit = 6
+    launched_limit = 120
+
+    def list_resources(self, fetch_events=True):
+        resources = []
+        starts, covered_from = rds_start_times.resolve('db-cluster', datetime.now(timezone.utc), fetch_events)
+        existing = set()
+        paginator = client_pool.get_client('rds', region).get_paginator('describe_db_clusters')
+        for page in paginator.paginate(Filters=[{'Name': 'engine', 'Values': ['aurora', 'aurora-mysql', 'aurora-postgresql']}]):
+            for cluster in page['DBClusters']:
+                existing.add(cluster['DBClusterIdentifier'])
+                if cluster.get('Status') in ('stopped', 'stopping'):
+                    continue
+                tags = tag_dict(cluster.get('TagList'))
+                # describe_db_clusters can't filter on tags
+                if tags.get('STATIC') != 'no':
+                    continue
+                resources.append({
+                    'name': cluster['DBClusterIdentifier'],
+                    'id': cluster['DBClusterArn'],
+                    'tags': tags,
+                    'start_time': rds_start_times.start_time(starts, covered_from, cluster['DBClusterIdentifier'], cluster.get('ClusterCreateTime')),
+                    'launch_time': cluster.get('ClusterCreateTime'),
+                    'resource_class': cluster.get('DBClusterInstanceClass', '')
+                })
+        if fetch_events:
+            rds_start_times.forget_deleted('db-cluster', existing)
+        return resources
+
+    def stop(self, name, resource_id):
+        try:
+            cluster = client_pool.get_client('rds', region).describe_db_clusters(DBClusterIdentifier=name)['DBClusters'][0]
+            curr_state = cluster.get('Status')
+
+            if curr_state.upper() == 'AVAILABLE':
+                client_pool.get_client('rds', region).stop_db_cluster(DBClusterIdentifier=name)
+                return ":heavy_check_mark: *" + name + "* successfuly stopping"
+            return self.no_action_message(name, curr_state)
+
+        except Exception as err:
+            logger.error('Error: %s' % str(err))
+            return ("Sorry, the *AURORA* cluster *" + name + "* does not exist or is not currently launched")
+
+    def is_running(self, name, resource_id):
+        response = client_pool.get_client('rds', region).describe_db_clusters(DBClusterIdentifier=name)
+        return response['DBClusters'][0]['Status'] != 'stopped'
+
+    def add_tags(self, name, resource_id, tags):
+        client_pool.get_client('rds', region).add_tags_to_resource(
+            ResourceName=resource_id,
+            Tags=[{'Key': key, 'Value': value} for key, value in tags.items()]
+        )
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Auto Scaling groups, stopped by scaling to zero
+class AutoScalingGroupProvider(ResourceProvider):
+
+    resource_type = 'ASG'
+    noun = 'Auto Scaling group'
+    running_limit = 4
+
+    def list_resources(self, fetch_events=True):
+        resources = []
+        paginator = client_pool.get_client('autoscaling', region).get_paginator('describe_auto_scaling_groups')
+        for page in paginator.paginate(Filters=[{'Name': 'tag:Static', 'Values': ['no']}]):
+            for group in page['AutoScalingGroups']:
+                if group['DesiredCapacity'] == 0:
+                    continue
+                # The name is also the ID, and IDs sent through Slack can't contain spaces
+                if ' ' in group['AutoScalingGroupName']:
+                    logger.error('Error: Auto Scaling group "' + group['AutoScalingGroupName'] + '" skipped, its name contains spaces')
+                    continue
+                # Scaling out doesn't change anything the group reports, so the
+                # start is unknown and launched_limit applies from creation
+                resources.append({
+                    'name': group['AutoScalingGroupName'],
+                    'id': group['AutoScalingGroupName'],
+                    'tags': tag_dict(group.get('Tags')),
+                    'start_time': None,
+                    'launch_time': group['CreatedTime'],
+                    'resource_class': ''
+                })
+        return resources
+
+    def stop(self, name, resource_id):
+        try:
+            client = client_pool.get_client('autoscaling', region)
+            group = client.describe_auto_scaling_groups(AutoScalingGroupNames=[resource_id])['AutoScalingGroups'][0]
+
+            if group['DesiredCapacity'] > 0:
+                client.update_auto_scaling_group(AutoScalingGroupName=resource_id, MinSize=0, DesiredCapacity=0)
+                return ":heavy_check_mark: *" + name + "* successfuly scaling to zero"
+            return self.no_action_message(name, 'scaled to zero')
+
+        except Exception as err:
+            logger.error('Error: %s' % str(err))
+            return ("Sorry, the *ASG* Auto Scaling group *" + name + "* cannot be found")
+
+    def is_running(self, name, resource_id):
+        response = client_pool.get_client('autoscaling', region).describe_auto_scaling_groups(AutoScalingGroupNames=[resource_id])
+        return response['AutoScalingGroups'][0]['DesiredCapacity'] > 0
+
+    def add_tags(self, name, resource_id, tags):
+        client_pool.get_client('autoscaling', region).create_or_update_tags(
+            Tags=[
+                {
+                    'ResourceId': resource_id,
+                    'ResourceType': 'auto-scaling-group',
+                    'Key': key,
+                    'Value': value,
+                    'PropagateAtLaunch': False
+                }
+                for key, value in tags.items()
+            ]
+        )
+
+# ----------------------------------------------------------------------------------------------------------------------
+# SageMaker notebook instances
+class SageMakerNotebookProvider(ResourceProvider):
+
+    resource_type = 'SAGEMAKER'
+    noun = 'notebook instance'
+    running_limit = 4
+
+    def list_resources(self, fetch_events=True):
+        # Notebook listings carry no tags, fetch them all in one paginated
+        # tagging API call rather than list_tags per notebook
+        tags_by_arn = {}
+        paginator = client_pool.get_client('resourcegroupstaggingapi', region).get_paginator('get_resources')
+        for page in paginator.paginate(ResourceTypeFilters=['sagemaker:notebook-instance'], TagFilters=[{'Key': 'Static', 'Values': ['no']}]):
+            for mapping in page['ResourceTagMappingList']:
+                tags_by_arn[mapping['ResourceARN']] = tag_dict(mapping.get('Tags'))
+
+        resources = []
+        if not tags_by_arn:
+            return resources
+        paginator = client_pool.get_client('sagemaker', region).get_paginator('list_notebook_instances')
+        for page in paginator.paginate(StatusEquals='InService'):
+            for notebook in page['NotebookInstances']:
+                if notebook['NotebookInstanceArn'] not in tags_by_arn:
+                    continue
+                # Starting a notebook instance updates its last modified time
+                resources.append({
+                    'name': notebook['NotebookInstanceName'],
+                    'id': notebook['NotebookInstanceArn'],
+                    'tags': tags_by_arn[notebook['NotebookInstanceArn']],
+                    'start_time': notebook['LastModifiedTime'],
+                    'launch_time': notebook['CreationTime'],
+                    'resource_class': notebook['InstanceType']
+                })
+        return resources
+
+    def stop(self, name, resource_id):
+        try:
+            client = client_pool.get_client('sagemaker', region)
+            curr_state = client.describe_notebook_instance(NotebookInstanceName=name)['NotebookInstanceStatus']
+
+            if curr_state == 'InService':
+                client.stop_notebook_instance(NotebookInstanceName=name)
+                return ":heavy_check_mark: *" + name + "* successfuly stopping"
+            return self.no_action_message(name, curr_state)
+
+        except Exception as err:
+            logger.error('Error: %s' % str(err))
+            return ("Sorry, the *SAGEMAKER* notebook instance *" + name + "* cannot be found")
+
+    def is_running(self, name, resource_id):
+        response = client_pool.get_client('sagemaker', region).describe_notebook_instance(NotebookInstanceName=name)
+        return response['NotebookInstanceStatus'] not in ('Stopped', 'Stopping')
+
+    def add_tags(self, name, resource_id, tags):
+        client_pool.get_client('sagemaker', region).add_tags(
+            ResourceArn=resource_id,
+            Tags=[{'Key': key, 'Value': value} for key, value in tags.items()]
+        )
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Redshift clusters, stopped by pausing
+class RedshiftProvider(ResourceProvider):
+
+    resource_type = 'REDSHIFT'
+    noun = 'cluster'
+    launched_limit = 120
+
+    def list_resources(self, fetch_events=True):
+        resources = []
+        arn_prefix = None
+        paginator = client_pool.get_client('redshift', region).get_paginator('describe_clusters')
+        for page in paginator.paginate(TagKeys=['Static'], TagValues=['no']):
+            for cluster in page['Clusters']:
+                if cluster['ClusterStatus'] != 'available':
+                    continue
+                # Redshift tagging needs the cluster ARN, which describe does not return
+                # The partition (aws, aws-cn, aws-us-gov) is taken from the caller's own ARN
+                if arn_prefix is None:
+                    identity = client_pool.get_client('sts').get_caller_identity()
+                    arn_prefix = 'arn:' + identity['Arn'].split(':')[1] + ':redshift:' + str(region) + ':' + identity['Account'] + ':cluster:'
+                resources.append({
+                    'name': cluster['ClusterIdentifier'],
+                    'id': arn_prefix + cluster['ClusterIdentifier'],
+                    'tags': tag_dict(cluster.get('Tags')),
+                    'start_time': None,
+                    'launch_time': cluster['ClusterCreateTime'],
+                    'resource_class': cluster['NodeType']
+                })
+        return resources
+
+    def stop(self, name, resource_id):
+        try:
+            client = client_pool.get_client('redshift', region)
+            curr_state = client.describe_clusters(ClusterIdentifier=name)['Clusters'][0]['ClusterStatus']
+
+            if curr_state == 'available':
+                client.pause_cluster(ClusterIdentifier=name)
+                return ":heavy_check_mark: *" + name + "* successfuly pausing"
+            return self.no_action_message(name, curr_state)
+
+        except Exception as err:
+            logger.error('Error: %s' % str(err))
+            return ("Sorry, the *REDSHIFT* cluster *" + name + "* cannot be found")
+
+    def is_running(self, name, resource_id):
+        response = client_pool.get_client('redshift', region).describe_clusters(ClusterIdentifier=name)
+        return response['Clusters'][0]['ClusterStatus'] not in ('paused', 'pausing')
+
+    def add_tags(self, name, resource_id, tags):
+        client_pool.get_client('redshift', region).create_tags(
+            ResourceName=resource_id,
+            Tags=[{'Key': key, 'Value': value} for key, value in tags.items()]
+        )
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Registry
+def register(provider):
+    PROVIDERS[provider.resource_type] = provider
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Provider for a resource type sent through Slack, e.g. 'EC2'
+def get_provider(resource_type):
+    return PROVIDERS[resource_type.upper()]
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Providers enabled by the RESOURCE_TYPES environment variable
+def enabled_providers():
+    return [PROVIDERS[resource_type.strip().upper()] for resource_type in RESOURCE_TYPES.split(',') if resource_type.strip()]
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Find stop candidates across all enabled providers
+# Providers are scanned concurrently, a failing provider is logged and skipped
+# Returns (candidates, resources, failed), resources being every running
+# resource listed, each with its resource_type added, for the inventory cache
+# and failed the resource types that could not be scanned
+def scan_all(nowdatetime):
+
+    def scan(provider):
+        try:
+            resources = provider.list_resources()
+            for resource in resources:
+                resource['resource_type'] = provider.resource_type
+            return provider.find_candidates(nowdatetime, resources), resources, None
+        except Exception as err:
+            logger.error('Error scanning ' + provider.resource_type + ': %s' % str(err))
+            return [], [], provider.resource_type
+
+    providers = enabled_providers()
+    if not providers:
+        return [], [], []
+    with ThreadPoolExecutor(max_workers=len(providers)) as executor:
+        results = list(executor.map(scan, providers))
+    candidates = [candidate for provider_candidates, provider_resources, failed_type in results for candidate in provider_candidates]
+    resources = [resource for provider_candidates, provider_resources, failed_type in results for resource in provider_resources]
+    failed = [failed_type for provider_candidates, provider_resources, failed_type in results if failed_type != None]
+    return candidates, resources, failed
+
+register(EC2Provider())
+register(RDSProvider())
+register(AuroraProvider())
+register(AutoScalingGroupProvider())
+register(SageMakerNotebookProvider())
+register(RedshiftProvider())
@@ -0,0 +1,446 @@
+# Scan history
+# Purpose - keeps a compact record of every reminder (flag) made by
+#           reminder_lambda and every action taken through
+#           final_response_lambda, and reports per-owner idle hours,
+#           stop-response rates and estimated savings from it
+#
+# Events are stored column by column in typed arrays, with string columns
+# dictionary encoded, and zlib compressed. Each write adds a small segment
+# file and reminder_lambda compacts a month's segments into one file at the
+# end of its run, so reports read one file per month
+#
+#   <store>/<YYYY-MM>/compacted.shs
+#   <store>/<YYYY-MM>/segments/<timestamp>-<uuid>.shs
+#
+# The store is a local directory or s3://bucket/prefix (HISTORY_STORE)
+#
+# Report usage:
+#   python scan_history.py s3://bucket/history --months 6 --costs costs.json
+#
+# Added to GitHub version control: 19/10/2026
+# Last updated: 19/10/2026
+
+import logging      # CloudWatch logs
+import argparse
+import bisect
+import json
+import os
+import struct
+import sys
+import time
+import uuid
+import zlib
+
+from array import array
+from datetime import datetime, timedelta, timezone
+
+# Configure logging
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Retrieve environment variables
+HISTORY_STORE = os.environ.get('HISTORY_STORE')
+HISTORY_S3_ENDPOINT_URL = os.environ.get('HISTORY_S3_ENDPOINT_URL')     # For S3 compatible stores
+
+MAGIC = b'SHS1'
+
+# Event kinds
+FLAGGED = 0     # Reminder sent by reminder_lambda
+STOP = 1        # Stopped through final_response_lambda
+RESERVE = 2     # Reserved through final_response_lambda, value = days
+KEEP_UP = 3     # Kept up through immediate_response_lambda
+AUTO_STOP = 4   # Stopped by auto_stop after its grace period
+KINDS = {'flagged': FLAGGED, 'stop': STOP, 'reserve': RESERVE, 'keep_up': KEEP_UP, 'auto_stop': AUTO_STOP}
+
+# Columns, (name, array typecode, dictionary encoded)
+COLUMNS = [
+    ('ts', 'd', False),                 # Event time, epoch seconds
+    ('kind', 'B', False),
+    ('resource_type', 'H', True),
+    ('resource_id', 'I', True),
+    ('owner', 'I', True),               # '' when unowned
+    ('resource_class', 'H', True),      # Instance type or size, '' when unknown
+    ('start', 'd', False),              # Start (or launch) time, epoch seconds, 0 when unknown
+    ('value', 'f', False)               # Reserve days
+]
+
+# Estimated savings
+DEFAULT_HOURLY_COST = 0.10      # ($) When neither resource class nor type has a cost
+SAVINGS_HORIZON = 24            # (Hours) Longest a stopped resource is assumed to have kept running
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Columnar event table
+class HistoryTable:
+
+    def __init__(self):
+        self.columns = {name: array(typecode) for name, typecode, encoded in COLUMNS}
+        # Dictionary encoded columns, values list and value -> code index
+        self.dictionaries = {name: [] for name, typecode, encoded in COLUMNS if encoded}
+        self.codes = {name: {} for name in self.dictionaries}
+
+    def __len__(self):
+        return len(self.columns['ts'])
+
+    def encode(self, name, value):
+        value = '' if value is None else str(value)
+        code = self.codes[name].get(value)
+        if code is None:
+            code = len(self.dictionaries[name])
+            self.dictionaries[name].append(value)
+            self.codes[name][value] = code
+        return code
+
+    # Add one event, timestamps are datetimes
+    def append(self, ts, kind, resource_type, resource_id, owner=None, resource_class=None, start=None, value=0):
+        self.columns['ts'].append(ts.timestamp())
+        self.columns['kind'].append(kind)
+        self.columns['resource_type'].append(self.encode('resource_type', resource_type))
+        self.columns['resource_id'].append(self.encode('resource_id', resource_id))
+        self.columns['owner'].append(self.encode('owner', owner))
+        self.columns['resource_class'].append(self.encode('resource_class', resource_class))
+        self.columns['start'].append(start.timestamp() if start is not None else 0)
+        self.columns['value'].append(float(value))
+
+    # Add all events from another table, re-encoding its dictionary columns
+    def extend(self, other):
+        for name, typecode, encoded in COLUMNS:
+            if encoded:
+                remap = [self.encode(name, value) for value in other.dictionaries[name]]
+                self.columns[name].extend(array(typecode, (remap[code] for code in other.columns[name])))
+            else:
+                self.columns[name].extend(other.columns[name])
+
+    def to_bytes(self):
+        header = {
+            'rows': len(self),
+            'byteorder': sys.byteorder,
+            'columns': [[name, typecode, len(self.columns[name]) * self.columns[name].itemsize] for name, typecode, encoded in COLUMNS],
+            'dictionaries': self.dictionaries
+        }
+        header = json.dumps(header).encode('utf-8')
+        body = b''.join(self.columns[name].tobytes() for name, typecode, encoded in COLUMNS)
+        return MAGIC + zlib.compress(struct.pack('<I', len(header)) + header + body)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError('Not a scan history file')
+        data = zlib.decompress(data[len(MAGIC):])
+        header_length = struct.unpack('<I', data[:4])[0]
+        header = json.loads(data[4:4 + header_length].decode('utf-8'))
+
+        table = cls()
+        offset = 4 + header_length
+        for name, typecode, nbytes in header['columns']:
+            column = array(typecode)
+            column.frombytes(data[offset:offset + nbytes])
+            if header['byteorder'] != sys.byteorder:
+                column.byteswap()
+            table.columns[name] = column
+            offset += nbytes
+        for name, values in header['dictionaries'].items():
+            table.dictionaries[name] = values
+            table.codes[name] = {value: code for code, value in enumerate(values)}
+        return table
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Local directory store
+class LocalStore:
+
+    def __init__(self, path):
+        self.path = path
+
+    def list(self, prefix):
+        directory = os.path.join(self.path, prefix)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(prefix + '/' + name for name in os.listdir(directory) if name.endswith('.shs'))
+
+    def read(self, name):
+        path = os.path.join(self.path, name)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as history_file:
+            return history_file.read()
+
+    def write(self, name, data):
+        path = os.path.join(self.path, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so readers never see a partial file
+        with open(path + '.tmp', 'wb') as history_file:
+            history_file.write(data)
+        os.replace(path + '.tmp', path)
+
+    def delete(self, name):
+        try:
+            os.remove(os.path.join(self.path, name))
+        except FileNotFoundError:
+            pass
+
+# ----------------------------------------------------------------------------------------------------------------------
+# S3 (or S3 compatible) object store
+class S3Store:
+
+    def __init__(self, bucket, prefix, endpoint_url=HISTORY_S3_ENDPOINT_URL):
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.endpoint_url = endpoint_url
+        self.endpoint_client = None
+
+    def key(self, name):
+        return self.prefix + '/' + name if self.prefix else name
+
+    # Imported here so that reports can be run on local stores without boto3
+    def client(self):
+        import client_pool  # Shared boto3 clients
+        if not self.endpoint_url:
+            return client_pool.get_client('s3')
+        if self.endpoint_client is None:
+            self.endpoint_client = client_pool.get_session().client('s3', endpoint_url=self.endpoint_url, config=client_pool.BOTO_CONFIG)
+        return self.endpoint_client
+
+    def list(self, prefix):
+        names = []
+        paginator = self.client().get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.key(prefix) + '/'):
+            for obj in page.get('Contents', []):
+                name = obj['Key'][len(self.key('')):]
+                # Only direct children of the prefix
+                if name.endswith('.shs') and '/' not in name[len(prefix) + 1:]:
+                    names.append(name)
+        return sorted(names)
+
+    def read(self, name):
+        try:
+            return self.client().get_object(Bucket=self.bucket, Key=self.key(name))['Body'].read()
+        except self.client().exceptions.NoSuchKey:
+            return None
+
+    def write(self, name, data):
+        self.client().put_object(Bucket=self.bucket, Key=self.key(name), Body=data)
+
+    def delete(self, name):
+        self.client().delete_object(Bucket=self.bucket, Key=self.key(name))
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Store for a location, s3://bucket/prefix or a local directory
+def open_store(location):
+    if location.startswith('s3://'):
+        bucket, _, prefix = location[len('s3://'):].partition('/')
+        return S3Store(bucket, prefix)
+    return LocalStore(location)
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Month partition for a datetime, e.g. 2018-10
+def month_of(when):
+    return when.strftime('%Y-%m')
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Write a table as a new segment of the month of its first event
+def write_segment(store, table):
+    if len(table) == 0:
+        return
+    month = month_of(datetime.fromtimestamp(table.columns['ts'][0], timezone.utc))
+    name = month + '/segments/' + str(int(time.time() * 1000)) + '-' + uuid.uuid4().hex + '.shs'
+    store.write(name, table.to_bytes())
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Merge a month's segments into its compacted file
+# Only the segments that were read are deleted, so segments written during
+# compaction are kept for the next run. Must only be run by one writer at a
+# time (reminder_lambda)
+def compact(store, month):
+    segments = store.list(month + '/segments')
+    if not segments:
+        return
+
+    table = HistoryTable()
+    compacted = store.read(month + '/compacted.shs')
+    if compacted is not None:
+        table.extend(HistoryTable.from_bytes(compacted))
+    for segment in segments:
+        table.extend(HistoryTable.from_bytes(store.read(segment)))
+
+    store.write(month + '/compacted.shs', table.to_bytes())
+    for segment in segments:
+        store.delete(segment)
+    logger.info("Compacted " + str(len(segments)) + " history segments into " + month + " (" + str(len(table)) + " events)")
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Load all events for the months between since and until
+def load(store, since, until):
+    table = HistoryTable()
+    month = since.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    while month <= until:
+        name = month_of(month)
+        compacted = store.read(name + '/compacted.shs')
+        if compacted is not None:
+            table.extend(HistoryTable.from_bytes(compacted))
+        for segment in store.list(name + '/segments'):
+            table.extend(HistoryTable.from_bytes(store.read(segment)))
+        month = (month + timedelta(days=32)).replace(day=1)
+    return table
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Record stop candidates flagged by one reminder run
+def record_flags(nowdatetime, candidates, location=HISTORY_STORE):
+    if not location:
+        return
+    try:
+        table = HistoryTable()
+        for candidate in candidates:
+            table.append(nowdatetime, FLAGGED, candidate['resource_type'], candidate['id'], candidate['owner'], candidate['resource_class'], candidate['start'])
+        store = open_store(location)
+        write_segment(store, table)
+        compact(store, month_of(nowdatetime))
+    except Exception as err:
+        logger.error('Error in def record_flags(): %s' % str(err))
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Record candidates stopped by auto_stop
+def record_auto_stops(nowdatetime, candidates, location=HISTORY_STORE):
+    if not location or not candidates:
+        return
+    try:
+        table = HistoryTable()
+        for candidate in candidates:
+            table.append(nowdatetime, AUTO_STOP, candidate['resource_type'], candidate['id'], candidate['owner'], candidate['resource_class'], candidate['start'])
+        write_segment(open_store(location), table)
+    except Exception as err:
+        logger.error('Error in def record_auto_stops(): %s' % str(err))
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Record a stop, reserve or keep up action
+def record_action(action, resource_type, resource_id, owner, value=0, location=HISTORY_STORE):
+    if not location:
+        return
+    try:
+        table = HistoryTable()
+        table.append(datetime.now(timezone.utc), KINDS[action], resource_type, resource_id, owner, value=value)
+        write_segment(open_store(location), table)
+    except Exception as err:
+        logger.error('Error in def record_action(): %s' % str(err))
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Reminder episodes between since_ts and until_ts, by resource ID code
+#
+# A reminder episode is one resource flagged from the same start time. Each
+# action is attached to the latest episode of its resource flagged before it.
+# Episodes are dicts of first_ts, last_ts, row (of the first flag), stop_ts,
+# auto_stop_ts, reserved and kept_up, ordered by first_ts
+def episodes(table, since_ts, until_ts):
+    ts = table.columns['ts']
+    kind = table.columns['kind']
+    resource_ids = table.columns['resource_id']
+    start = table.columns['start']
+
+    by_start = {}
+    actions = []
+    for row in sorted(range(len(table)), key=ts.__getitem__):
+        if not since_ts <= ts[row] <= until_ts:
+            continue
+        if kind[row] == FLAGGED:
+            resource_episodes = by_start.setdefault(resource_ids[row], {})
+            episode = resource_episodes.get(start[row])
+            if episode is None:
+                resource_episodes[start[row]] = {'first_ts': ts[row], 'last_ts': ts[row], 'row': row, 'stop_ts': None, 'auto_stop_ts': None, 'reserved': False, 'kept_up': False}
+            else:
+                episode['last_ts'] = ts[row]
+        else:
+            actions.append(row)
+
+    ordered = {resource_id: sorted(resource_episodes.values(), key=lambda episode: episode['first_ts']) for resource_id, resource_episodes in by_start.items()}
+    firsts = {resource_id: [episode['first_ts'] for episode in resource_episodes] for resource_id, resource_episodes in ordered.items()}
+    for row in actions:
+        position = bisect.bisect_right(firsts.get(resource_ids[row], []), ts[row]) - 1
+        if position < 0:
+            continue
+        episode = ordered[resource_ids[row]][position]
+        if kind[row] == STOP and episode['stop_ts'] is None:
+            episode['stop_ts'] = ts[row]
+        elif kind[row] == AUTO_STOP and episode['auto_stop_ts'] is None:
+            episode['auto_stop_ts'] = ts[row]
+        elif kind[row] == RESERVE:
+            episode['reserved'] = True
+        elif kind[row] == KEEP_UP:
+            episode['kept_up'] = True
+    return ordered
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Per owner report over the events between since and until
+#
+# For each owner:
+# - flagged: reminder episodes
+# - stopped / reserved: episodes answered with a stop / reserve
+# - auto_stopped: episodes stopped by auto_stop
+# - stop_response_rate: stopped / flagged
+# - idle_hours: hours from the first reminder of an episode until the
+#   resource was stopped or, if it never was, its last reminder
+# - estimated_savings: for each stop (including auto stops), the hourly cost
+#   of the resource class (or resource type) over the hours until it was next
+#   flagged, capped at SAVINGS_HORIZON hours
+def report(store, since, until, hourly_costs=None, default_hourly_cost=DEFAULT_HOURLY_COST):
+    hourly_costs = hourly_costs or {}
+    table = load(store, since, until)
+    until_ts = until.timestamp()
+
+    results = {}
+    for resource_id, resource_episodes in episodes(table, since.timestamp(), until_ts).items():
+        for position, episode in enumerate(resource_episodes):
+            row = episode['row']
+            owner_name = table.dictionaries['owner'][table.columns['owner'][row]] or 'unowned'
+            result = results.setdefault(owner_name, {'flagged': 0, 'stopped': 0, 'auto_stopped': 0, 'reserved': 0, 'idle_hours': 0.0, 'estimated_savings': 0.0})
+            result['flagged'] += 1
+            result['reserved'] += 1 if episode['reserved'] else 0
+
+            stops = [stop_ts for stop_ts in (episode['stop_ts'], episode['auto_stop_ts']) if stop_ts is not None]
+            stop_ts = min(stops) if stops else None
+            end_ts = episode['last_ts'] if stop_ts is None else stop_ts
+            result['idle_hours'] += max(end_ts - episode['first_ts'], 0) / 3600
+
+            if episode['stop_ts'] is not None:
+                result['stopped'] += 1
+            elif episode['auto_stop_ts'] is not None:
+                result['auto_stopped'] += 1
+
+            if stop_ts is not None:
+                if position + 1 < len(resource_episodes):
+                    saved_until = resource_episodes[position + 1]['first_ts']
+                else:
+                    saved_until = until_ts
+                saved_hours = min(max(saved_until - stop_ts, 0) / 3600, SAVINGS_HORIZON)
+                resource_class = table.dictionaries['resource_class'][table.columns['resource_class'][row]]
+                resource_type = table.dictionaries['resource_type'][table.columns['resource_type'][row]]
+                hourly_cost = hourly_costs.get(resource_class, hourly_costs.get(resource_type, default_hourly_cost))
+                result['estimated_savings'] += saved_hours * hourly_cost
+
+    for result in results.values():
+        result['stop_response_rate'] = result['stopped'] / result['flagged']
+        result['idle_hours'] = round(result['idle_hours'], 1)
+        result['estimated_savings'] = round(result['estimated_savings'], 2)
+    return results
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Command line report
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Report idle hours, stop-response rates and estimated savings per owner')
+    parser.add_argument('store', nargs='?', default=HISTORY_STORE, help='History store, a directory or s3://bucket/prefix')
+    parser.add_argument('--months', type=int, default=3, help='Months of history to report on')
+    parser.add_argument('--costs', help='JSON file of hourly costs by resource class or resource type')
+    args = parser.parse_args(argv)
+    if not args.store:
+        parser.error('a history store is required (or set HISTORY_STORE)')
+
+    hourly_costs = None
+    if args.costs:
+        with open(args.costs) as costs_file:
+            hourly_costs = json.load(costs_file)
+
+    until = datetime.now(timezone.utc)
+    since = until - timedelta(days=31 * args.months)
+    results = report(open_store(args.store), since, until, hourly_costs)
+    print(json.dumps(results, indent=4, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
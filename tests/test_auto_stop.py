@@ -0,0 +1,213 @@
+# Auto stop tests
+# Purpose - checks which reminders auto_stop treats as unanswered, the checks
+#           made on freshly listed resources, and how bulk stop results are
+#           mapped back to candidates, against a local scan history and a fake
+#           provider
+#
+# Run from the repository root with: python -m unittest discover tests
+# (boto3 must be installed, as it is in the Lambda runtime)
+#
+# Added to GitHub version control: 19/10/2026
+# Last updated: 19/10/2026
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+try:
+    import boto3
+except ImportError:
+    boto3 = None
+
+if boto3 is not None:
+    import auto_stop
+    import resource_providers
+    import scan_history
+
+GRACE_HOURS = 24
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Candidate as returned by find_candidates()
+def make_candidate(resource_id, start, resource_type='FAKE', owner='alice'):
+    return {
+        'resource_type': resource_type,
+        'noun': 'instance',
+        'name': 'name-' + resource_id,
+        'id': resource_id,
+        'owner': owner,
+        'resource_class': 'm5.large',
+        'start': start,
+        'uptime': ''
+    }
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Resource as returned by list_resources()
+def make_resource(resource_id, start, tags=None):
+    return {
+        'name': 'name-' + resource_id,
+        'id': resource_id,
+        'tags': tags if tags is not None else {'STATIC': 'no', 'OWNER': 'alice'},
+        'start_time': start,
+        'launch_time': start,
+        'resource_class': 'm5.large'
+    }
+
+# ----------------------------------------------------------------------------------------------------------------------
+# Provider listing fixed resources, stopping all but the IDs in refuse
+if boto3 is not None:
+    class FakeProvider(resource_providers.ResourceProvider):
+
+        resource_type = 'FAKE'
+
+        def __init__(self, resources, refuse=()):
+            self.resources = resources
+            self.refuse = refuse
+            self.stopped = []
+
+        def list_resources(self, fetch_events=True):
+            return [dict(resource) for resource in self.resources]
+
+        def stop(self, name, resource_id):
+            if resource_id in self.refuse:
+                return self.no_action_message(name, 'stopping')
+            self.stopped.append(resource_id)
+            return resource_providers.STOPPED_MARK + " *" + name + "* successfuly stopped"
+
+# ----------------------------------------------------------------------------------------------------------------------
+@unittest.skipIf(boto3 is None, 'boto3 is not installed')
+class UnansweredTest(unittest.TestCase):
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        # record_action() stamps actions with the current time
+        self.now = datetime.now(timezone.utc).replace(microsecond=0)
+        self.start = self.now - timedelta(days=3)
+
+    def tearDown(self):
+        shutil.rmtree(self.location)
+
+    def flag(self, hours_ago, candidates):
+        scan_history.record_flags(self.now - timedelta(hours=hours_ago), candidates, location=self.location)
+
+    def pending_ids(self, candidates):
+        later = self.now + timedelta(minutes=1)
+        return [candidate['id'] for candidate in auto_stop.unanswered(later, candidates, GRACE_HOURS, location=self.location)]
+
+    def test_reminder_older_than_grace_is_unanswered(self):
+        candidate = make_candidate('i-1', self.start)
+        self.flag(30, [candidate])
+        self.flag(2, [candidate])
+        self.assertEqual(self.pending_ids([candidate]), ['i-1'])
+
+    def test_reminder_inside_grace_is_not_unanswered(self):
+        candidate = make_candidate('i-1', self.start)
+        self.flag(2, [candidate])
+        self.assertEqual(self.pending_ids([candidate]), [])
+
+    def test_never_reminded_is_not_unanswered(self):
+        self.flag(30, [make_candidate('i-1', self.start)])
+        self.assertEqual(self.pending_ids([make_candidate('i-2', self.start)]), [])
+
+    def test_responses_answer_the_reminder(self):
+        candidates = [make_candidate(resource_id, self.start) for resource_id in ('i-keep', 'i-reserve', 'i-stop', 'i-quiet')]
+        self.flag(30, candidates)
+        scan_history.record_action('keep_up', 'FAKE', 'i-keep', 'alice', location=self.location)
+        scan_history.record_action('reserve', 'FAKE', 'i-reserve', 'alice', value=2, location=self.location)
+        scan_history.record_action('stop', 'FAKE', 'i-stop', 'alice', location=self.location)
+        self.assertEqual(self.pending_ids(candidates), ['i-quiet'])
+
+    def test_auto_stopped_is_not_stopped_again(self):
+        candidate = make_candidate('i-1', self.start)
+        self.flag(30, [candidate])
+        scan_history.record_auto_stops(self.now - timedelta(hours=1), [candidate], location=self.location)
+        self.assertEqual(self.pending_ids([candidate]), [])
+
+    def test_restart_starts_a_new_episode(self):
+        # Kept up in its previous run, then restarted and reminded again recently
+        old = make_candidate('i-1', self.start)
+        self.flag(30, [old])
+        scan_history.record_action('keep_up', 'FAKE', 'i-1', 'alice', location=self.location)
+        restarted = make_candidate('i-1', self.now - timedelta(hours=10))
+        self.assertEqual(self.pending_ids([restarted]), [])
+
+    def test_response_to_previous_run_does_not_answer_current_one(self):
+        old_start = self.now - timedelta(days=10)
+        new_start = self.now - timedelta(days=2)
+        self.flag(24 * 9, [make_candidate('i-1', old_start)])
+        self.flag(30, [make_candidate('i-1', new_start)])
+        self.assertEqual(self.pending_ids([make_candidate('i-1', new_start)]), ['i-1'])
+
+# ----------------------------------------------------------------------------------------------------------------------
+@unittest.skipIf(boto3 is None, 'boto3 is not installed')
+class StillStoppableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = datetime(2026, 10, 19, 12, tzinfo=timezone.utc)
+        self.start = self.now - timedelta(days=2)
+        self.candidate = make_candidate('i-1', self.start)
+
+    def test_unchanged_resource_is_stoppable(self):
+        self.assertTrue(auto_stop.still_stoppable(make_resource('i-1', self.start), self.candidate, self.now))
+
+    def test_resource_made_static_is_not_stoppable(self):
+        resource = make_resource('i-1', self.start, {'STATIC': 'yes'})
+        self.assertFalse(auto_stop.still_stoppable(resource, self.candidate, self.now))
+
+    def test_reserved_resource_is_not_stoppable(self):
+        resource = make_resource('i-1', self.start, {'STATIC': 'no', 'RESERVED_UNTIL': str(self.now + timedelta(hours=1))})
+        self.assertFalse(auto_stop.still_stoppable(resource, self.candidate, self.now))
+
+    def test_expired_reservation_is_stoppable(self):
+        resource = make_resource('i-1', self.start, {'STATIC': 'no', 'RESERVED_UNTIL': str(self.now - timedelta(hours=1))})
+        self.assertTrue(auto_stop.still_stoppable(resource, self.candidate, self.now))
+
+    def test_restarted_resource_is_not_stoppable(self):
+        resource = make_resource('i-1', self.now - timedelta(hours=1))
+        self.assertFalse(auto_stop.still_stoppable(resource, self.candidate, self.now))
+
+    def test_unknown_start_is_not_stoppable(self):
+        # e.g. an ASG scaled to zero and back out keeps its creation time
+        resource = make_resource('i-1', self.start)
+        resource['start_time'] = None
+        self.assertFalse(auto_stop.still_stoppable(resource, self.candidate, self.now))
+
+# ----------------------------------------------------------------------------------------------------------------------
+@unittest.skipIf(boto3 is None, 'boto3 is not installed')
+class StopResourceTypeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = datetime(2026, 10, 19, 12, tzinfo=timezone.utc)
+        self.start = self.now - timedelta(days=2)
+
+    def tearDown(self):
+        resource_providers.PROVIDERS.pop('FAKE', None)
+
+    def test_results_are_mapped_back_to_candidates(self):
+        provider = FakeProvider([
+            make_resource('i-stop', self.start),
+            make_resource('i-refuse', self.start),
+            make_resource('i-static', self.start, {'STATIC': 'yes'})
+        ], refuse=('i-refuse',))
+        resource_providers.register(provider)
+
+        candidates = [make_candidate(resource_id, self.start) for resource_id in ('i-stop', 'i-refuse', 'i-static', 'i-gone')]
+        results = auto_stop.stop_resource_type('FAKE', candidates, self.now)
+
+        self.assertEqual(provider.stopped, ['i-stop'])
+        self.assertEqual(sorted((candidate['id'], stopped) for candidate, message, stopped in results), [('i-refuse', False), ('i-stop', True)])
+        for candidate, message, stopped in results:
+            self.assertIs(candidate, candidates[0] if candidate['id'] == 'i-stop' else candidates[1])
+            self.assertEqual(message.startswith(resource_providers.STOPPED_MARK), stopped)
+
+    def test_nothing_to_stop(self):
+        resource_providers.register(FakeProvider([]))
+        self.assertEqual(auto_stop.stop_resource_type('FAKE', [make_candidate('i-gone', self.start)], self.now), [])
+
+if __name__ == '__main__':
+    unittest.main()
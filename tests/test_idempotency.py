@@ -0,0 +1,145 @@
+# Idempotency cache tests
+# Purpose - checks claims, their pending lease, recorded outcomes and releases,
+#           in a container's own cache and through a fake shared DynamoDB table
+#
+# Run from the repository root with: python -m unittest discover tests
+# (boto3 must be installed, as it is in the Lambda runtime)
+#
+# Added to GitHub version control: 19/10/2026
+# Last updated: 19/10/2026
+
+import os
+import sys
+import unittest
+
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+try:
+    import boto3
+except ImportError:
+    boto3 = None
+
+if boto3 is not None:
+    import idempotency
+    from botocore.exceptions import ClientError
+
+# ----------------------------------------------------------------------------------------------------------------------
+# DynamoDB client keeping the idempotency table in a dict, supporting only
+# the calls and condition idempotency makes
+class FakeDynamoDB:
+
+    def __init__(self):
+        self.items = {}
+        self.fail_get = False
+
+    def put_item(self, TableName, Item, ConditionExpression=None, ExpressionAttributeValues=None):
+        key = Item['idempotency_key']['S']
+        existing = self.items.get(key)
+        if ConditionExpression and existing is not None and int(existing['expires_at']['N']) >= int(ExpressionAttributeValues[':now']['N']):
+            raise ClientError({'Error': {'Code': 'ConditionalCheckFailedException', 'Message': ''}}, 'PutItem')
+        self.items[key] = Item
+
+    def get_item(self, TableName, Key, ConsistentRead=False):
+        if self.fail_get:
+            raise ClientError({'Error': {'Code': 'ProvisionedThroughputExceededException', 'Message': ''}}, 'GetItem')
+        item = self.items.get(Key['idempotency_key']['S'])
+        return {'Item': item} if item is not None else {}
+
+    def delete_item(self, TableName, Key):
+        self.items.pop(Key['idempotency_key']['S'], None)
+
+# ----------------------------------------------------------------------------------------------------------------------
+@unittest.skipIf(boto3 is None, 'boto3 is not installed')
+class IdempotencyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000000
+        self.patches = [
+            mock.patch('time.time', lambda: self.now),
+            mock.patch.object(idempotency, 'emit_duplicate_metric', lambda scope: None)
+        ]
+        for patch in self.patches:
+            patch.start()
+        idempotency.local_cache.clear()
+        self.key = idempotency.idempotency_key('final_response', 'C1', '1.0', 'EC2 web i-1 alice', 'button', 'stop')
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        idempotency.local_cache.clear()
+
+    def use_table(self):
+        self.dynamodb = FakeDynamoDB()
+        for patch in [
+            mock.patch.object(idempotency, 'IDEMPOTENCY_TABLE', 'idempotency'),
+            mock.patch.object(idempotency.client_pool, 'get_client', lambda service, *args, **kwargs: self.dynamodb)
+        ]:
+            patch.start()
+            self.patches.append(patch)
+
+    def other_container(self):
+        # Another container only shares the table
+        idempotency.local_cache.clear()
+
+    def test_key_includes_action_name(self):
+        other = idempotency.idempotency_key('final_response', 'C1', '1.0', 'EC2 db i-2 alice', 'button', 'stop')
+        self.assertNotEqual(self.key, other)
+
+    def test_first_claim_then_pending_then_outcome(self):
+        self.assertIsNone(idempotency.claim(self.key))
+        self.assertEqual(idempotency.claim(self.key), idempotency.PENDING)
+        idempotency.record(self.key, 'done')
+        self.assertEqual(idempotency.claim(self.key), 'done')
+
+    def test_pending_claim_lapses_after_lease(self):
+        self.assertIsNone(idempotency.claim(self.key))
+        self.now += idempotency.IDEMPOTENCY_PENDING_LEASE + 1
+        self.assertIsNone(idempotency.claim(self.key))
+
+    def test_released_key_is_claimed_again(self):
+        self.assertIsNone(idempotency.claim(self.key))
+        idempotency.release(self.key)
+        self.assertIsNone(idempotency.claim(self.key))
+
+    def test_short_ttl_record_lapses(self):
+        self.assertIsNone(idempotency.claim(self.key))
+        idempotency.record(self.key, 'stopping', idempotency.IDEMPOTENCY_PENDING_LEASE)
+        self.assertEqual(idempotency.claim(self.key), 'stopping')
+        self.now += idempotency.IDEMPOTENCY_PENDING_LEASE + 1
+        self.assertIsNone(idempotency.claim(self.key))
+
+    def test_shared_outcome_seen_by_other_container(self):
+        self.use_table()
+        self.assertIsNone(idempotency.claim(self.key))
+        idempotency.record(self.key, 'done')
+        self.other_container()
+        self.assertEqual(idempotency.claim(self.key), 'done')
+
+    def test_shared_pending_claim_lapses_after_lease(self):
+        # The first request's container died without recording or releasing
+        self.use_table()
+        self.assertIsNone(idempotency.claim(self.key))
+        self.other_container()
+        self.assertEqual(idempotency.claim(self.key), idempotency.PENDING)
+        self.now += idempotency.IDEMPOTENCY_PENDING_LEASE + 1
+        self.assertIsNone(idempotency.claim(self.key))
+
+    def test_release_from_other_container_beats_local_cache(self):
+        self.use_table()
+        self.assertIsNone(idempotency.claim(self.key))
+        idempotency.record(self.key, 'stopping')
+        # Released by another Lambda, this container's cache still holds the outcome
+        self.dynamodb.delete_item(TableName='idempotency', Key={'idempotency_key': {'S': self.key}})
+        self.assertIsNone(idempotency.claim(self.key))
+
+    def test_unreadable_shared_outcome_fails_open(self):
+        self.use_table()
+        self.assertIsNone(idempotency.claim(self.key))
+        self.other_container()
+        self.dynamodb.fail_get = True
+        self.assertIsNone(idempotency.claim(self.key))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+# RDS start times tests
+# Purpose - checks the start event index is built, brought up to date and
+#           saved correctly, and the start time given to each source, against
+#           a fake RDS event history and a local store
+#
+# Run from the repository root with: python -m unittest discover tests
+# (boto3 must be installed, as it is in the Lambda runtime)
+#
+# Added to GitHub version control: 19/10/2026
+# Last updated: 19/10/2026
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+try:
+    import boto3
+except ImportError:
+    boto3 = None
+
+if boto3 is not None:
+    import rds_start_times
+
+NOW = datetime(2026, 10, 19, 12, tzinfo=timezone.utc)
+
+# ----------------------------------------------------------------------------------------------------------------------
+# RDS client whose describe_events paginator serves a fixed event history
+class FakeRDS:
+
+    def __init__(self, events):
+        self.events = events
+        self.calls = []
+        self.fail = False
+
+    def get_paginator(self, operation):
+        return self
+
+    def paginate(self, SourceType, StartTime, EndTime):
+        self.calls.append((SourceType, StartTime, EndTime))
+        if self.fail:
+            raise RuntimeError('throttled')
+        events = [event for event in self.events if StartTime <= event['Date'] <= EndTime]
+        # Two pages, as a paginator would return them
+        return [{'Events': events[:1]}, {'Events': events[1:]}]
+
+def event(identifier, date, message='DB instance started'):
+    return {'SourceIdentifier': identifier, 'Date': date, 'Message': message}
+
+# ----------------------------------------------------------------------------------------------------------------------
+@unittest.skipIf(boto3 is None, 'boto3 is not installed')
+class ResolveTest(unittest.TestCase):
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.rds = FakeRDS([])
+        self.patches = [
+            mock.patch.object(rds_start_times, 'START_INDEX_STORE', self.location),
+            mock.patch.object(rds_start_times.client_pool, 'get_client', lambda service, *args, **kwargs: self.rds)
+        ]
+        for patch in self.patches:
+            patch.start()
+        rds_start_times.indexes.clear()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        rds_start_times.indexes.clear()
+        shutil.rmtree(self.location)
+
+    def cold_start(self):
+        # A new container only has the saved index
+        rds_start_times.indexes.clear()
+
+    def test_new_index_covers_the_event_history(self):
+        self.rds.events = [
+            event('db-1', NOW - timedelta(days=3)),
+            event('db-1', NOW - timedelta(days=1), 'DB instance restarted'),
+            event('db-2', NOW - timedelta(days=2), 'DB instance stopped')
+        ]
+        starts, covered_from = rds_start_times.resolve('db-instance', NOW)
+        self.assertEqual(starts, {'db-1': NOW - timedelta(days=1)})
+        self.assertEqual(covered_from, NOW - rds_start_times.LOOKBACK)
+        self.assertEqual(self.rds.calls, [('db-instance', NOW - rds_start_times.LOOKBACK, NOW)])
+
+    def test_saved_index_is_brought_up_to_date(self):
+        self.rds.events = [event('db-1', NOW - timedelta(days=3))]
+        rds_start_times.resolve('db-instance', NOW)
+        self.cold_start()
+
+        later = NOW + timedelta(hours=1)
+        self.rds.events.append(event('db-2', NOW + timedelta(minutes=30)))
+        starts, covered_from = rds_start_times.resolve('db-instance', later)
+        # Only events since the last fetch (less the overlap) are read
+        self.assertEqual(self.rds.calls[-1], ('db-instance', NOW - rds_start_times.OVERLAP, later))
+        self.assertEqual(starts, {'db-1': NOW - timedelta(days=3), 'db-2': NOW + timedelta(minutes=30)})
+        self.assertEqual(covered_from, NOW - rds_start_times.LOOKBACK)
+
+    def test_index_older_than_the_event_history_is_reset(self):
+        self.rds.events = [event('db-1', NOW - timedelta(days=3))]
+        rds_start_times.resolve('db-instance', NOW)
+
+        later = NOW + timedelta(days=20)
+        self.rds.events = [event('db-2', later - timedelta(days=1))]
+        starts, covered_from = rds_start_times.resolve('db-instance', later)
+        self.assertEqual(starts, {'db-2': later - timedelta(days=1)})
+        self.assertEqual(covered_from, later - rds_start_times.LOOKBACK)
+
+    def test_without_a_store_nothing_is_assumed_for_sources_with_no_event(self):
+        with mock.patch.object(rds_start_times, 'START_INDEX_STORE', None):
+            self.rds.events = [event('db-1', NOW - timedelta(days=3))]
+            starts, covered_from = rds_start_times.resolve('db-instance', NOW)
+        self.assertEqual(starts, {'db-1': NOW - timedelta(days=3)})
+        self.assertIsNone(covered_from)
+
+    def test_without_fetching_the_saved_index_is_used_as_it_is(self):
+        self.rds.events = [event('db-1', NOW - timedelta(days=3))]
+        rds_start_times.resolve('db-instance', NOW)
+        self.cold_start()
+        calls = len(self.rds.calls)
+
+        starts, covered_from = rds_start_times.resolve('db-instance', NOW + timedelta(hours=1), fetch_events=False)
+        self.assertEqual(len(self.rds.calls), calls)
+        self.assertEqual(starts, {'db-1': NOW - timedelta(days=3)})
+        self.assertEqual(covered_from, NOW - rds_start_times.LOOKBACK)
+
+    def test_without_fetching_or_an_index_nothing_is_known(self):
+        self.assertEqual(rds_start_times.resolve('db-instance', NOW, fetch_events=False), ({}, None))
+        self.assertEqual(self.rds.calls, [])
+
+    def test_unreadable_event_history(self):
+        self.rds.fail = True
+        self.assertEqual(rds_start_times.resolve('db-instance', NOW), ({}, None))
+
+    def test_deleted_sources_are_forgotten(self):
+        self.rds.events = [event('db-1', NOW - timedelta(days=3)), event('db-2', NOW - timedelta(days=2))]
+        rds_start_times.resolve('db-instance', NOW)
+        rds_start_times.forget_deleted('db-instance', {'db-2'})
+        self.cold_start()
+        starts, covered_from = rds_start_times.resolve('db-instance', NOW, fetch_events=False)
+        self.assertEqual(starts, {'db-2': NOW - timedelta(days=2)})
+
+# ----------------------------------------------------------------------------------------------------------------------
+@unittest.skipIf(boto3 is None, 'boto3 is not installed')
+class StartTimeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.covered_from = NOW - timedelta(days=14)
+        self.starts = {'db-1': NOW - timedelta(days=1)}
+
+    def test_start_event(self):
+        self.assertEqual(rds_start_times.start_time(self.starts, self.covered_from, 'db-1', NOW - timedelta(days=30)), NOW - timedelta(days=1))
+
+    def test_no_start_event_since_the_index_began(self):
+        self.assertEqual(rds_start_times.start_time(self.starts, self.covered_from, 'db-2', NOW - timedelta(days=30)), self.covered_from)
+
+    def test_created_after_the_index_began(self):
+        created = NOW - timedelta(days=5)
+        self.assertEqual(rds_start_times.start_time(self.starts, self.covered_from, 'db-2', created), created)
+
+    def test_no_start_event_and_no_store(self):
+        self.assertIsNone(rds_start_times.start_time(self.starts, None, 'db-2', NOW - timedelta(days=30)))
+
+if __name__ == '__main__':
+    unittest.main()
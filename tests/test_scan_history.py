@@ -0,0 +1,164 @@
+# Scan history tests
+# Purpose - checks the columnar file format round trips, segments are
+#           compacted without losing events, and reminder episodes and the
+#           per owner report are worked out correctly, against a local store
+#
+# Run from the repository root with: python -m unittest discover tests
+#
+# Added to GitHub version control: 19/10/2026
+# Last updated: 19/10/2026
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import scan_history
+
+T0 = datetime(2026, 10, 5, 9, tzinfo=timezone.utc)
+START = T0 - timedelta(days=2)
+
+def hours(count):
+    return T0 + timedelta(hours=count)
+
+def rows(table):
+    # Events as tuples of decoded values, in table order
+    decoded = []
+    for row in range(len(table)):
+        values = []
+        for name, typecode, encoded in scan_history.COLUMNS:
+            value = table.columns[name][row]
+            values.append(table.dictionaries[name][value] if encoded else value)
+        decoded.append(tuple(values))
+    return decoded
+
+# ----------------------------------------------------------------------------------------------------------------------
+class HistoryTableTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        table = scan_history.HistoryTable()
+        table.append(T0, scan_history.FLAGGED, 'EC2', 'i-1', 'alice', 't3.micro', START)
+        table.append(hours(1), scan_history.RESERVE, 'RDS', 'arn:db-1', None, value=2)
+        table.append(hours(2), scan_history.STOP, 'EC2', 'i-1', 'alice')
+
+        copy = scan_history.HistoryTable.from_bytes(table.to_bytes())
+        self.assertEqual(rows(copy), rows(table))
+        self.assertEqual(rows(copy)[1], (hours(1).timestamp(), scan_history.RESERVE, 'RDS', 'arn:db-1', '', '', 0, 2.0))
+
+    def test_not_a_history_file(self):
+        with self.assertRaises(ValueError):
+            scan_history.HistoryTable.from_bytes(b'PK\x03\x04')
+
+    def test_extend_re_encodes_dictionaries(self):
+        first = scan_history.HistoryTable()
+        first.append(T0, scan_history.FLAGGED, 'EC2', 'i-1', 'alice')
+        second = scan_history.HistoryTable()
+        # Same values under different codes
+        second.append(hours(1), scan_history.FLAGGED, 'RDS', 'db-1', 'bob')
+        second.append(hours(2), scan_history.STOP, 'EC2', 'i-1', 'alice')
+
+        merged = scan_history.HistoryTable()
+        merged.extend(first)
+        merged.extend(second)
+        self.assertEqual(rows(merged), rows(first) + rows(second))
+        self.assertEqual(merged.dictionaries['resource_id'], ['i-1', 'db-1'])
+
+# ----------------------------------------------------------------------------------------------------------------------
+class StoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.store = scan_history.open_store(self.location)
+
+    def tearDown(self):
+        shutil.rmtree(self.location)
+
+    def segment(self, *events):
+        table = scan_history.HistoryTable()
+        for event in events:
+            table.append(*event)
+        scan_history.write_segment(self.store, table)
+
+    def test_compaction_keeps_every_event(self):
+        self.segment((T0, scan_history.FLAGGED, 'EC2', 'i-1', 'alice', 't3.micro', START))
+        self.segment((hours(1), scan_history.STOP, 'EC2', 'i-1', 'alice'))
+        month = scan_history.month_of(T0)
+        before = rows(scan_history.load(self.store, T0, hours(2)))
+
+        scan_history.compact(self.store, month)
+        self.assertEqual(self.store.list(month + '/segments'), [])
+        self.assertEqual(rows(scan_history.load(self.store, T0, hours(2))), before)
+
+        # Compacting again adds later segments to the compacted file
+        self.segment((hours(3), scan_history.FLAGGED, 'EC2', 'i-2', 'bob', 't3.micro', START))
+        scan_history.compact(self.store, month)
+        self.assertEqual(len(scan_history.load(self.store, T0, hours(4))), 3)
+
+    def test_load_reads_every_month_in_range(self):
+        next_month = datetime(2026, 11, 2, tzinfo=timezone.utc)
+        self.segment((T0, scan_history.FLAGGED, 'EC2', 'i-1', 'alice', 't3.micro', START))
+        self.segment((next_month, scan_history.FLAGGED, 'EC2', 'i-1', 'alice', 't3.micro', START))
+        self.assertEqual(len(scan_history.load(self.store, T0, next_month)), 2)
+        self.assertEqual(len(scan_history.load(self.store, next_month, next_month)), 1)
+
+    def test_episodes(self):
+        restart = hours(4)
+        self.segment(
+            (T0, scan_history.FLAGGED, 'EC2', 'i-1', 'alice', 't3.micro', START),
+            (hours(2), scan_history.FLAGGED, 'EC2', 'i-1', 'alice', 't3.micro', START),
+            (hours(3), scan_history.STOP, 'EC2', 'i-1', 'alice'),
+            (hours(5), scan_history.FLAGGED, 'EC2', 'i-1', 'alice', 't3.micro', restart),
+            (hours(6), scan_history.KEEP_UP, 'EC2', 'i-1', 'alice'),
+            # An action with no reminder before it is ignored
+            (hours(1), scan_history.RESERVE, 'EC2', 'i-2', 'bob', None, None, 1)
+        )
+        table = scan_history.load(self.store, T0, hours(7))
+        by_resource = scan_history.episodes(table, T0.timestamp(), hours(7).timestamp())
+
+        self.assertEqual(list(by_resource), [table.codes['resource_id']['i-1']])
+        first, second = by_resource[table.codes['resource_id']['i-1']]
+        self.assertEqual((first['first_ts'], first['last_ts'], first['stop_ts'], first['kept_up']), (T0.timestamp(), hours(2).timestamp(), hours(3).timestamp(), False))
+        self.assertEqual((second['first_ts'], second['stop_ts'], second['kept_up']), (hours(5).timestamp(), None, True))
+
+    def test_report(self):
+        self.segment(
+            # alice stops i-1, which is started and flagged again later
+            (T0, scan_history.FLAGGED, 'EC2', 'i-1', 'alice', 't3.micro', START),
+            (hours(2), scan_history.FLAGGED, 'EC2', 'i-1', 'alice', 't3.micro', START),
+            (hours(3), scan_history.STOP, 'EC2', 'i-1', 'alice'),
+            (hours(5), scan_history.FLAGGED, 'EC2', 'i-1', 'alice', 't3.micro', hours(4)),
+            # bob's db-1 is auto stopped and never comes back
+            (T0, scan_history.FLAGGED, 'RDS', 'db-1', 'bob', 'db.m5.large', START),
+            (hours(1), scan_history.AUTO_STOP, 'RDS', 'db-1', 'bob', 'db.m5.large', START),
+            # An unowned instance is reserved
+            (T0, scan_history.FLAGGED, 'EC2', 'i-3', None, 't3.micro', START),
+            (hours(1), scan_history.RESERVE, 'EC2', 'i-3', None, None, None, 2)
+        )
+        costs = {'EC2': 0.5, 'db.m5.large': 1.0}
+        results = scan_history.report(self.store, T0, hours(100), costs)
+
+        self.assertEqual(results['alice'], {
+            'flagged': 2, 'stopped': 1, 'auto_stopped': 0, 'reserved': 0,
+            # 3 hours until the stop, the second episode has a single reminder
+            'idle_hours': 3.0,
+            # 2 hours stopped until flagged again, at the EC2 rate
+            'estimated_savings': 1.0,
+            'stop_response_rate': 0.5
+        })
+        self.assertEqual(results['bob'], {
+            'flagged': 1, 'stopped': 0, 'auto_stopped': 1, 'reserved': 0,
+            'idle_hours': 1.0,
+            # Capped at the savings horizon, at the class rate
+            'estimated_savings': scan_history.SAVINGS_HORIZON * 1.0,
+            'stop_response_rate': 0.0
+        })
+        self.assertEqual(results['unowned']['reserved'], 1)
+        self.assertEqual(results['unowned']['estimated_savings'], 0.0)
+
+if __name__ == '__main__':
+    unittest.main()